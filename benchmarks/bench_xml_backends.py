@@ -0,0 +1,109 @@
+"""
+Compare ReqifParser XML backends on a synthetic ReqIF file.
+
+    python benchmarks/bench_xml_backends.py --requirements 2000
+"""
+import argparse
+import json
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from testgen.reqif_parser import ReqifParser
+from testgen.xml_backend import get_backend
+
+NAMESPACE = "http://www.omg.org/spec/ReqIF/20110401/reqif.xsd"
+TITLE_REFS = {"_RequirementType": "_Requirement", "_TestType": "_Test", "_TestCaseType": "_TestCase"}
+
+
+def _attribute(definition_ref, value):
+    value = value.replace("&", "&amp;").replace('"', "&quot;").replace("<", "&lt;")
+    return (f'<ATTRIBUTE-VALUE-STRING THE-VALUE="{value}"><DEFINITION>'
+            f'<ATTRIBUTE-DEFINITION-STRING-REF>{definition_ref}</ATTRIBUTE-DEFINITION-STRING-REF>'
+            f'</DEFINITION></ATTRIBUTE-VALUE-STRING>')
+
+
+def _spec_object(identifier, spec_type, title, extra=""):
+    prefix = TITLE_REFS[spec_type]
+    return (f'<SPEC-OBJECT IDENTIFIER="{identifier}"><TYPE><SPEC-OBJECT-TYPE-REF>{spec_type}'
+            f'</SPEC-OBJECT-TYPE-REF></TYPE><VALUES>{_attribute(prefix + "_Title", title)}'
+            f'{_attribute(prefix + "_Description", "Description of " + title)}{extra}</VALUES></SPEC-OBJECT>')
+
+
+def _hierarchy(identifier, children=""):
+    children = f"<CHILDREN>{children}</CHILDREN>" if children else ""
+    return (f'<SPEC-HIERARCHY IDENTIFIER="h-{identifier}"><OBJECT><SPEC-OBJECT-REF>{identifier}'
+            f'</SPEC-OBJECT-REF></OBJECT>{children}</SPEC-HIERARCHY>')
+
+
+def write_reqif(path: Path, requirements: int, tests: int, cases: int):
+    parameters = json.dumps([{"name": "value", "type": "int", "value": ["1", "2", "3"]}])
+    case_attributes = _attribute("_Steps", "a,b,c") + _attribute("_Parameters", parameters)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f'<?xml version="1.0" encoding="UTF-8"?><REQ-IF xmlns="{NAMESPACE}"><THE-HEADER>'
+                f'<REQ-IF-HEADER IDENTIFIER="header"><TITLE>Benchmark</TITLE><PROJECT-ID>bench</PROJECT-ID>'
+                f'</REQ-IF-HEADER></THE-HEADER><CORE-CONTENT><REQ-IF-CONTENT><SPEC-OBJECTS>')
+        for r in range(requirements):
+            f.write(_spec_object(f"R{r}", "_RequirementType", f"Requirement {r}"))
+            for t in range(tests):
+                f.write(_spec_object(f"R{r}T{t}", "_TestType", f"Test {t}"))
+                for c in range(cases):
+                    f.write(_spec_object(f"R{r}T{t}C{c}", "_TestCaseType", f"Case {c}", case_attributes))
+        f.write('</SPEC-OBJECTS><SPECIFICATIONS><SPECIFICATION IDENTIFIER="spec"><CHILDREN>')
+        for r in range(requirements):
+            tests_xml = "".join(
+                _hierarchy(f"R{r}T{t}", "".join(_hierarchy(f"R{r}T{t}C{c}") for c in range(cases)))
+                for t in range(tests)
+            )
+            f.write(_hierarchy(f"R{r}", tests_xml))
+        f.write('</CHILDREN></SPECIFICATION></SPECIFICATIONS></REQ-IF-CONTENT></CORE-CONTENT></REQ-IF>')
+
+
+def _best_of(repeat, func):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench(path: Path, backend: str, repeat: int):
+    xml_backend = get_backend(backend)
+    read_time, _ = _best_of(repeat, lambda: sum(1 for _ in xml_backend.iter_records(path)))
+    parse_time, nodes = _best_of(repeat, lambda: ReqifParser(path, backend=backend).parse_reqif())
+    tracemalloc.start()
+    ReqifParser(path, backend=backend).parse_reqif()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return read_time, parse_time, peak, len(nodes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ReqifParser XML backends")
+    parser.add_argument("--requirements", type=int, default=1000)
+    parser.add_argument("--tests", type=int, default=5)
+    parser.add_argument("--cases", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.reqif"
+        write_reqif(path, args.requirements, args.tests, args.cases)
+        size_mb = path.stat().st_size / 1024 / 1024
+        objects = args.requirements * (1 + args.tests * (1 + args.cases))
+        print(f"{objects} spec objects, {size_mb:.1f} MB")
+        for backend in ("stdlib", "lxml"):
+            try:
+                read_time, parse_time, peak, roots = bench(path, backend, args.repeat)
+            except ImportError:
+                print(f"{backend:>8}: not installed")
+                continue
+            print(f"{backend:>8}: read {read_time:.3f} s, parse {parse_time:.3f} s, "
+                  f"peak {peak / 1024 / 1024:.1f} MB traced, {roots} roots")
+
+
+if __name__ == "__main__":
+    main()
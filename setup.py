@@ -10,15 +10,17 @@ setup(
     packages=find_packages(),
     python_requires='>=3.6',
     install_requires=["jinja2>=3.0",
-                      "pydantic>=2.0.0",
                       "python-dotenv>=0.19.0",
-                      "pydantic-settings>=2.0.0",
+                      "tomli>=1.1.0; python_version < '3.11'",
                       "gitignore_parser>=0.1.12",
                       "pytest>=8.3.0",
                       "allure-pytest>=2.13.1",
                       "requests>=2.32.0",
                       "allure-python-commons>=2.14.1",
                       ],
+    extras_require={
+        "lxml": ["lxml>=4.6"],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
@@ -32,7 +34,11 @@ setup(
             'typhoon_testgen = testgen.generator:main',
             'coverage_check = testgen.coverage_check:main',
             'typhoon_test_update = testgen.update_tests:main',
-            'upload_report = testgen.upload_report:main'
+            'upload_report = testgen.upload_report:main',
+            'typhoon_req_index = testgen.req_index:main',
+            'typhoon_batch = testgen.batch:main',
+            'typhoon_upload = testgen.uploader:main',
+            'typhoon_telemetry = testgen.telemetry:main'
         ]
     }
 )
\ No newline at end of file
@@ -0,0 +1,178 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+from testgen.coverage_check import (compare_structures, differences_to_dict, expected_structure_from_nodes,
+                                    get_existing_structure)
+from testgen.generator import TestGenerator
+from testgen.ignore import load_ignore_matcher
+from testgen.layouts import LAYOUTS, TREE_LAYOUT
+from testgen.reqif_parser import ReqifParser, TreeNode, STRUCTURE_FIELDS
+from testgen.settings import get_settings
+from testgen.update_tests import update_tests
+
+CHECK = "check"
+UPDATE = "update"
+GENERATE = "generate"
+COMMANDS = (CHECK, UPDATE, GENERATE)
+
+
+@dataclass
+class BatchRoot:
+    reqif: Path
+    tests: Path
+    layout: str = TREE_LAYOUT
+
+
+def load_manifest(manifest_path: Path) -> List[BatchRoot]:
+    """
+    Read a manifest of test roots. It is a JSON list, or an object with a ``roots`` list, of
+    ``{"reqif": ..., "tests": ..., "layout": ...}`` entries with paths relative to the manifest.
+    """
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    entries = data.get("roots", []) if isinstance(data, dict) else data
+    base_dir = manifest_path.parent
+    roots = []
+    for entry in entries:
+        layout = entry.get("layout", TREE_LAYOUT)
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown layout '{layout}' for tests path '{entry['tests']}'")
+        roots.append(BatchRoot(
+            reqif=(base_dir / entry["reqif"]).resolve(),
+            tests=(base_dir / entry["tests"]).resolve(),
+            layout=layout,
+        ))
+    return roots
+
+
+def _process_root(command: str, root: BatchRoot, nodes: List[TreeNode], header_data: Optional[Dict],
+                  structure_only: bool) -> Optional[Dict]:
+    if not root.tests.exists():
+        if command != GENERATE:
+            raise FileNotFoundError(f"Tests path '{root.tests}' does not exist")
+        root.tests.mkdir(parents=True)
+    matcher = load_ignore_matcher(root.tests)
+    if command == CHECK:
+        expected = expected_structure_from_nodes(nodes, matcher, structure_only=structure_only, layout=root.layout)
+        existing = get_existing_structure(root.tests, matcher, parse_tests=not structure_only, layout=root.layout)
+        return differences_to_dict(compare_structures(existing, expected), existing)
+
+    test_generator = TestGenerator(nodes, root.tests, header_data["project_id"], matcher, root.layout)
+    if command == UPDATE:
+        update_tests(test_generator, matcher)
+    else:
+        test_generator.generate()
+    return None
+
+
+def process_reqif(command: str, reqif_path: Path, roots: List[BatchRoot], structure_only: bool = False) -> List[Dict]:
+    """Parse one ReqIF file and run ``command`` for every root that uses it."""
+    reports = []
+    nodes = []
+    header_data = None
+    reqif_error = None
+    if not reqif_path.exists():
+        reqif_error = f"Reqif path '{reqif_path}' does not exist"
+    else:
+        # Roots already run in parallel, archive members are parsed in this process.
+        parser = ReqifParser(reqif_path, workers=1, fields=STRUCTURE_FIELDS if structure_only else None)
+        nodes = parser.parse_reqif()
+        if command != CHECK:
+            header_data = parser.parse_header_data()
+            if header_data is None:
+                reqif_error = f"Could not read the header of '{reqif_path}'"
+
+    for root in roots:
+        report = {"reqif": str(root.reqif), "tests": str(root.tests), "layout": root.layout}
+        if reqif_error is not None:
+            report.update(status="error", error=reqif_error)
+        else:
+            try:
+                result = _process_root(command, root, nodes, header_data, structure_only)
+                report["status"] = "ok"
+                if result is not None:
+                    report["result"] = result
+            except Exception as e:
+                report.update(status="error", error=str(e))
+        reports.append(report)
+    return reports
+
+
+def run_batch(command: str, roots: List[BatchRoot], workers: Optional[int] = None,
+              structure_only: bool = False) -> Dict:
+    """
+    Run ``command`` for every root. Roots are grouped by ReqIF file so each file is parsed once,
+    and the groups are processed in a pool of worker processes.
+    """
+    groups: Dict[Path, List[int]] = {}
+    for index, root in enumerate(roots):
+        groups.setdefault(root.reqif, []).append(index)
+
+    reports: List[Optional[Dict]] = [None] * len(roots)
+    workers = min(workers or get_settings().WORKERS or os.cpu_count() or 1, len(groups))
+    if workers <= 1:
+        results = [
+            process_reqif(command, reqif_path, [roots[i] for i in indices], structure_only)
+            for reqif_path, indices in groups.items()
+        ]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(process_reqif, command, reqif_path, [roots[i] for i in indices], structure_only)
+                for reqif_path, indices in groups.items()
+            ]
+            results = [future.result() for future in futures]
+    for indices, group_reports in zip(groups.values(), results):
+        for index, report in zip(indices, group_reports):
+            reports[index] = report
+
+    summary = {
+        "roots": len(reports),
+        "failed": sum(1 for report in reports if report["status"] == "error"),
+    }
+    if command == CHECK:
+        for key in ("missing_folders", "extra_folders", "missing_files", "extra_files", "skipped_tests"):
+            summary[key] = sum(len(report["result"][key]) for report in reports if "result" in report)
+        for key in ("missing_tests", "extra_tests", "modified_tests"):
+            summary[key] = sum(
+                len(tests) for report in reports if "result" in report
+                for tests in report["result"][key].values()
+            )
+    return {"command": command, "summary": summary, "roots": reports}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate, update or check tests for many test roots at once")
+    parser.add_argument('command', choices=COMMANDS, help="What to run for every root")
+    parser.add_argument('manifest', type=str, help="JSON manifest of {reqif, tests, layout} entries")
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help="Number of worker processes (default: WORKERS from the settings, or one per CPU)")
+    parser.add_argument('-o', '--output', type=str, default=None,
+                        help="File to write the aggregated JSON report to (default: standard output)")
+    parser.add_argument('--structure-only', action='store_true',
+                        help="With check, only compare folders and test files")
+
+    args = parser.parse_args()
+
+    manifest_path = Path(args.manifest)
+    if not manifest_path.exists():
+        print(f"Error: Manifest '{manifest_path}' does not exist")
+        return
+
+    try:
+        roots = load_manifest(manifest_path)
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"Error: Invalid manifest '{manifest_path}': {e}")
+        return
+
+    report = run_batch(args.command, roots, args.workers, args.structure_only and args.command == CHECK)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report), encoding='utf-8')
+    else:
+        print(json.dumps(report))
+    sys.exit(1 if report["summary"]["failed"] else 0)
@@ -1,15 +1,20 @@
 import argparse
 import ast
+import hashlib
 import json
 import os
+import subprocess
 import sys
 from pathlib import Path
-from typing import Dict, Set, List, Optional
+from typing import Dict, Iterable, Set, List, Optional
 from dataclasses import dataclass
-from gitignore_parser import parse_gitignore
 from testgen import TreeNode
-from testgen.reqif_parser import ReqifParser
-from testgen.generator import sanitize_name
+from testgen.ignore import IgnoreMatcher, load_ignore_matcher
+from testgen.reqif_parser import ReqifParser, STRUCTURE_FIELDS, requirement_digests
+from testgen.layouts import (DATA_FILE_NAME, DATA_IMPLEMENTATIONS_NAME, DATA_LAYOUT, DATA_RUNNER_NAME, PlannedFolder,
+                             TREE_LAYOUT, add_layout_argument, get_layout)
+from testgen.settings import get_settings
+from testgen.selection import RequirementSelector, add_selection_arguments, selector_from_args, OUT_OF_SCOPE, IN_SCOPE
 
 
 @dataclass
@@ -31,59 +36,124 @@ class Difference:
     modified_tests: Dict[str, Dict]
 
 
-def get_existing_structure(tests_path: Path, matches) -> TestStructure:
+def get_existing_structure(tests_path: Path, matcher: IgnoreMatcher, parse_tests: bool = True,
+                           selector: Optional[RequirementSelector] = None, layout: str = TREE_LAYOUT,
+                           rel_root: Path = Path()) -> TestStructure:
+    """
+    Read the tests directory. ``rel_root`` restricts the walk to one of its subdirectories,
+    paths in the result stay relative to ``tests_path``.
+    """
+    if layout == DATA_LAYOUT:
+        return get_existing_data_structure(tests_path, parse_tests)
     folders = set()
     files = set()
     test_cases = {}
     skipped_test_cases = []
-    for root, dirs, filenames in os.walk(tests_path):
-        if matches and matches(root):
-            continue
+    for root, dirs, filenames in os.walk(tests_path / rel_root):
         rel_path = Path(root).relative_to(tests_path)
+        matcher.prune(rel_path, dirs)
+        if selector:
+            dirs[:] = [d for d in dirs if selector.path_scope(rel_path / d) != OUT_OF_SCOPE]
         if str(rel_path) != '.':
             folders.add(str(rel_path).lower())
         for filename in filenames:
             if filename.startswith('test_') and filename.endswith('.py'):
-                abs_file_path = Path(root) / filename
-                if matches and matches(abs_file_path):
+                rel_file_path = rel_path / filename
+                if matcher.matches(rel_file_path):
+                    continue
+                if selector and selector.path_scope(rel_file_path) != IN_SCOPE:
                     continue
-                rel_file_path = abs_file_path.relative_to(tests_path)
+                abs_file_path = Path(root) / filename
                 files.add(str(rel_file_path))
-                test_cases[str(rel_file_path)], new_skipped_test_cases = parse_test_file(Path(abs_file_path), rel_file_path)
+                if not parse_tests:
+                    continue
+                test_cases[str(rel_file_path)], new_skipped_test_cases = parse_test_file(abs_file_path, rel_file_path)
                 skipped_test_cases += new_skipped_test_cases
 
     return TestStructure(folders=folders, files=files, test_cases=test_cases, skipped_test_cases=skipped_test_cases)
 
 
-def get_expected_structure(reqif_path: str, matches, ignore_dir : Path) -> TestStructure:
-    parser = ReqifParser(reqif_path)
+def get_existing_data_structure(tests_path: Path, parse_tests: bool = True) -> TestStructure:
+    """Existing structure of the data layout, read from the data file and the implementations module."""
+    files = {name for name in (DATA_FILE_NAME, DATA_RUNNER_NAME) if (tests_path / name).exists()}
+    test_cases = {}
+    skipped_test_cases = []
+    data_path = tests_path / DATA_FILE_NAME
+    if parse_tests and data_path.exists():
+        with open(data_path, 'r', encoding='utf-8') as f:
+            cases = json.load(f).get("cases", [])
+        implemented = set()
+        implementations_path = tests_path / DATA_IMPLEMENTATIONS_NAME
+        if implementations_path.exists():
+            with open(implementations_path, 'r', encoding='utf-8') as f:
+                tree = ast.parse(f.read())
+            implemented = {
+                node.name[5:] for node in tree.body
+                if isinstance(node, ast.FunctionDef) and node.name.startswith('case_')
+            }
+        test_cases[DATA_FILE_NAME] = {}
+        for case in cases:
+            params = dict(case)
+            name = params.pop('function')
+            params.pop('path', None)
+            test_cases[DATA_FILE_NAME][name] = params
+            if name not in implemented:
+                skipped_test_cases.append((DATA_FILE_NAME + "\\" + name).lower())
+    return TestStructure(folders=set(), files=files, test_cases=test_cases, skipped_test_cases=skipped_test_cases)
+
+
+def get_expected_structure(reqif_path: str, matcher: IgnoreMatcher, structure_only: bool = False,
+                           selector: Optional[RequirementSelector] = None, layout: str = TREE_LAYOUT) -> TestStructure:
+    parser = ReqifParser(reqif_path, fields=STRUCTURE_FIELDS if structure_only else None, selector=selector)
+    data = parser.parse_reqif()
+    return expected_structure_from_nodes(data, matcher, structure_only, layout)
+
+
+def get_expected_structure_with_digests(reqif_path: str, matcher: IgnoreMatcher, structure_only: bool = False,
+                                        layout: str = TREE_LAYOUT, previous: Optional[TestStructure] = None,
+                                        previous_digests: Optional[Dict[str, str]] = None):
+    """
+    Build the expected structure and the requirement digests of the ReqIF file from one parse.
+    With ``previous`` and the ``previous_digests`` it was built with, test cases of files whose
+    requirements are unchanged are reused from ``previous`` instead of being decoded again.
+    """
+    parser = ReqifParser(reqif_path, fields=STRUCTURE_FIELDS if structure_only else None)
     data = parser.parse_reqif()
+    # Structure-only checks never read test cases, their digests would go unused.
+    digests = {} if structure_only else requirement_digests(data)
+    changed_ids = None
+    if previous is not None and previous_digests is not None:
+        changed_ids = {node_id for node_id, digest in digests.items() if previous_digests.get(node_id) != digest}
+    return expected_structure_from_nodes(data, matcher, structure_only, layout, previous, changed_ids), digests
 
+
+def expected_structure_from_nodes(data: List[TreeNode], matcher: IgnoreMatcher, structure_only: bool = False,
+                                  layout: str = TREE_LAYOUT, previous: Optional[TestStructure] = None,
+                                  changed_ids: Optional[Set[str]] = None) -> TestStructure:
     folders = set()
     files = set()
     test_cases = {}
 
-    def process_node(node, current_path: Path):
-        if node.type == "_RequirementType":
-            folder_name = sanitize_name(node.label)
-            if not matches or not matches(str(ignore_dir) + "\\" + str(current_path / folder_name)):
-                folders.add(str(current_path / folder_name).lower())
-            for child in node.children:
-                process_node(child, current_path / folder_name)
-        elif node.type == "_TestType":
-            file_name = f"test_{sanitize_name(node.label.lower())}.py"
-            file_path = str(current_path / file_name)
-            if matches and matches(str(ignore_dir) + "\\" + file_path):
-                return
-            files.add(file_path.lower())
-            test_cases[file_path] = {
-                sanitize_name(child.label.lower()): get_test_params(child)
-                for child in node.children
-                if child.type == "_TestCaseType"
-            }
-
-    for node in data:
-        process_node(node, Path())
+    for item in get_layout(layout).plan(data, matcher):
+        if isinstance(item, PlannedFolder):
+            folders.add(str(item.path).lower())
+            continue
+        file_path = str(item.path)
+        files.add(file_path.lower())
+        if structure_only:
+            continue
+        if previous is not None and changed_ids is not None:
+            previous_cases = previous.test_cases.get(file_path)
+            if (previous_cases is not None and list(previous_cases) == item.function_names
+                    and not any(case.id in changed_ids for case in item.test_cases)):
+                test_cases[file_path] = previous_cases
+                continue
+        test_cases[file_path] = {
+            name: get_test_params(case)
+            for name, case in zip(item.function_names, item.test_cases)
+        }
+    if layout == DATA_LAYOUT:
+        files.add(DATA_RUNNER_NAME)
 
     return TestStructure(folders=folders, files=files, test_cases=test_cases, skipped_test_cases=None)
 
@@ -251,11 +321,222 @@ def compare_structures(existing: TestStructure, expected: TestStructure) -> Diff
     )
 
 
+def differences_to_dict(differences: Difference, existing: TestStructure) -> Dict:
+    return {
+        'missing_folders': list(differences.missing_folders),
+        'extra_folders': list(differences.extra_folders),
+        'missing_files': list(differences.missing_files),
+        'extra_files': list(differences.extra_files),
+        'missing_tests': differences.missing_tests,
+        'extra_tests': differences.extra_tests,
+        'modified_tests': differences.modified_tests,
+        'skipped_tests': existing.skipped_test_cases,
+    }
+
+
+COVERAGE_STATE_FILE_NAME = ".typhoon-coverage.json"
+COVERAGE_STATE_VERSION = 2
+
+
+def _structure_to_dict(structure: TestStructure) -> Dict:
+    return {
+        'folders': sorted(structure.folders),
+        'files': sorted(structure.files),
+        'test_cases': structure.test_cases,
+        'skipped_test_cases': structure.skipped_test_cases,
+    }
+
+
+def _structure_from_dict(data: Dict) -> TestStructure:
+    return TestStructure(
+        folders=set(data['folders']),
+        files=set(data['files']),
+        test_cases=data['test_cases'],
+        skipped_test_cases=data['skipped_test_cases'],
+    )
+
+
+def file_digest(file_path) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@dataclass
+class CoverageState:
+    """Structures of the last coverage check, stored so the next one only redoes what changed."""
+    layout: str
+    structure_only: bool
+    reqif_digest: str
+    # Digest of every requirement the expected structure was built from, by id.
+    requirement_digests: Dict[str, str]
+    expected: TestStructure
+    existing: TestStructure
+
+    @classmethod
+    def load(cls, state_path: Path) -> Optional["CoverageState"]:
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != COVERAGE_STATE_VERSION:
+            return None
+        return cls(
+            layout=data['layout'],
+            structure_only=data['structure_only'],
+            reqif_digest=data['reqif_digest'],
+            requirement_digests=data['requirement_digests'],
+            expected=_structure_from_dict(data['expected']),
+            existing=_structure_from_dict(data['existing']),
+        )
+
+    def save(self, state_path: Path):
+        data = {
+            'version': COVERAGE_STATE_VERSION,
+            'layout': self.layout,
+            'structure_only': self.structure_only,
+            'reqif_digest': self.reqif_digest,
+            'requirement_digests': self.requirement_digests,
+            'expected': _structure_to_dict(self.expected),
+            'existing': _structure_to_dict(self.existing),
+        }
+        state_path.write_text(json.dumps(data), encoding='utf-8')
+
+
+def git_changed_paths(rev_range: str, cwd: Path) -> List[Path]:
+    """
+    Absolute paths changed in ``rev_range``, as understood by ``git diff``, plus untracked files.
+    Renames are reported as a deletion and an addition so both paths are revisited.
+    """
+    def git(*args) -> str:
+        return subprocess.run(['git', *args], cwd=cwd, capture_output=True, text=True, check=True).stdout
+
+    top_level = Path(git('rev-parse', '--show-toplevel').strip())
+    names = git('diff', '--name-only', '--no-renames', '-z', rev_range).split('\0')
+    names += git('ls-files', '--others', '--exclude-standard', '-z', '--full-name').split('\0')
+    return [top_level / name for name in names if name]
+
+
+def tests_relative_paths(paths: Iterable[Path], tests_path: Path) -> Set[Path]:
+    """Paths inside the tests directory, relative to it. Other paths are dropped."""
+    root = tests_path.resolve()
+    relative = set()
+    for path in paths:
+        try:
+            relative.add(Path(path).resolve().relative_to(root))
+        except ValueError:
+            continue
+    return relative
+
+
+def _is_ignored(matcher: IgnoreMatcher, rel_path: Path, is_dir: bool) -> bool:
+    if matcher.matches(rel_path, is_dir=is_dir):
+        return True
+    return any(matcher.matches(parent, is_dir=True) for parent in rel_path.parents if str(parent) != '.')
+
+
+def _within(path: str, root: str) -> bool:
+    return path == root or path.startswith(root + os.sep)
+
+
+def update_existing_structure(previous: TestStructure, tests_path: Path, matcher: IgnoreMatcher,
+                              changed_paths: Set[Path], parse_tests: bool = True,
+                              layout: str = TREE_LAYOUT) -> TestStructure:
+    """
+    Refresh a stored existing structure for the changed paths, relative to ``tests_path``.
+    Entries at or below a changed path are dropped and read again from disk.
+    """
+    if layout == DATA_LAYOUT:
+        data_files = {DATA_FILE_NAME, DATA_RUNNER_NAME, DATA_IMPLEMENTATIONS_NAME}
+        if any(str(path) in data_files for path in changed_paths):
+            return get_existing_data_structure(tests_path, parse_tests)
+        return previous
+
+    folders = set(previous.folders)
+    files = set(previous.files)
+    test_cases = dict(previous.test_cases)
+    skipped_test_cases = list(previous.skipped_test_cases or [])
+
+    for rel_path in sorted(changed_paths):
+        key = str(rel_path)
+        folders = {folder for folder in folders if not _within(folder, key.lower())}
+        files = {file for file in files if not _within(file, key)}
+        test_cases = {file: cases for file, cases in test_cases.items() if not _within(file, key)}
+        skipped_test_cases = [
+            case for case in skipped_test_cases
+            if not (case.startswith(key.lower() + "\\") or _within(case, key.lower()))
+        ]
+
+        # Folders leading to the changed path may have been created or removed.
+        for parent in rel_path.parents:
+            if str(parent) == '.':
+                continue
+            if (tests_path / parent).is_dir() and not _is_ignored(matcher, parent, is_dir=True):
+                folders.add(str(parent).lower())
+            else:
+                folders.discard(str(parent).lower())
+
+        abs_path = tests_path / rel_path
+        if abs_path.is_dir():
+            if _is_ignored(matcher, rel_path, is_dir=True):
+                continue
+            refreshed = get_existing_structure(tests_path, matcher, parse_tests=parse_tests, rel_root=rel_path)
+            folders |= refreshed.folders
+            files |= refreshed.files
+            test_cases.update(refreshed.test_cases)
+            skipped_test_cases += refreshed.skipped_test_cases
+        elif (abs_path.is_file() and rel_path.name.startswith('test_') and rel_path.name.endswith('.py')
+              and not _is_ignored(matcher, rel_path, is_dir=False)):
+            files.add(key)
+            if parse_tests:
+                test_cases[key], new_skipped_test_cases = parse_test_file(abs_path, rel_path)
+                skipped_test_cases += new_skipped_test_cases
+
+    return TestStructure(folders=folders, files=files, test_cases=test_cases, skipped_test_cases=skipped_test_cases)
+
+
+def incremental_structures(reqif_path: Path, tests_path: Path, matcher: IgnoreMatcher, state: CoverageState,
+                           changed_paths: Set[Path]) -> CoverageState:
+    """
+    ``state`` brought up to date. The ReqIF file is only parsed again if it changed since the
+    state was stored, and then only test files containing changed requirements are rebuilt.
+    """
+    reqif_digest = file_digest(reqif_path)
+    if reqif_digest == state.reqif_digest:
+        expected, digests = state.expected, state.requirement_digests
+    else:
+        expected, digests = get_expected_structure_with_digests(
+            str(reqif_path), matcher, structure_only=state.structure_only, layout=state.layout,
+            previous=state.expected, previous_digests=state.requirement_digests
+        )
+    existing = update_existing_structure(state.existing, tests_path, matcher, changed_paths,
+                                         parse_tests=not state.structure_only, layout=state.layout)
+    return CoverageState(state.layout, state.structure_only, reqif_digest, digests, expected, existing)
+
+
 def main():
     parser = argparse.ArgumentParser(description="Check test coverage against reqif file")
-    parser.add_argument('reqif_path', type=str, help="Path to the .reqif file")
+    parser.add_argument('reqif_path', type=str, help="Path to the .reqif or .reqifz file")
     parser.add_argument('tests_path', type=str, help="Path to the tests directory")
-
+    parser.add_argument('--structure-only', action='store_true',
+                        help="Only compare folders and test files, test functions are not checked")
+    add_selection_arguments(parser)
+    add_layout_argument(parser)
+    incremental = parser.add_argument_group('incremental check')
+    incremental.add_argument('--incremental', action='store_true',
+                             help="Only re-check changed test paths and requirements, reusing the stored state "
+                                  "of the previous check. A full check is done when there is no usable state")
+    incremental.add_argument('--changed', nargs='+', action='extend', default=[], metavar='PATH',
+                             help="Changed files or folders, relative to the current directory")
+    incremental.add_argument('--git-range', type=str, default=None, metavar='RANGE',
+                             help="Take the changed paths from git, e.g. origin/main...HEAD, or HEAD for "
+                                  "uncommitted changes. Untracked files are included")
+    incremental.add_argument('--state', type=str, default=None, metavar='PATH',
+                             help=f"Coverage state file (default: COVERAGE_STATE_FILE from the settings, "
+                                  f"or <tests_path>/{COVERAGE_STATE_FILE_NAME})")
 
     args = parser.parse_args()
 
@@ -264,25 +545,59 @@ def main():
         print(f"Error: Tests path '{tests_path}' does not exist")
         return
 
-    ignore_file_path = tests_path / '.typhoonignore'
-    matches = None
-    if ignore_file_path.exists():
-        matches = parse_gitignore(ignore_file_path, base_dir=tests_path)
+    if args.layout != TREE_LAYOUT and (args.only or args.exclude):
+        print(f"Error: --only and --exclude are only supported with the {TREE_LAYOUT} layout")
+        return
+
+    if args.incremental and (args.only or args.exclude):
+        print("Error: --incremental can not be combined with --only or --exclude")
+        return
+
+    if args.incremental and not (args.changed or args.git_range):
+        print("Error: --incremental needs the changed paths, pass --changed or --git-range")
+        return
 
+    matcher = load_ignore_matcher(tests_path)
 
-    existing = get_existing_structure(tests_path, matches)
-    expected = get_expected_structure(args.reqif_path, matches, tests_path)
+    state = None
+    changed_paths = set()
+    state_path = Path(args.state or get_settings().COVERAGE_STATE_FILE or tests_path / COVERAGE_STATE_FILE_NAME)
+    if args.incremental:
+        changed_paths = tests_relative_paths(args.changed, tests_path)
+        if args.git_range:
+            try:
+                changed_paths |= tests_relative_paths(git_changed_paths(args.git_range, tests_path), tests_path)
+            except (OSError, subprocess.CalledProcessError) as e:
+                print(f"Error: Could not read changed paths from git: {getattr(e, 'stderr', None) or e}")
+                return
+        state = CoverageState.load(state_path)
+        # A changed ignore file or different options invalidate the whole state.
+        if state is not None and (state.layout != args.layout or state.structure_only != args.structure_only
+                                  or Path(get_settings().IGNORE_FILE) in changed_paths):
+            state = None
+
+    if state is not None:
+        state = incremental_structures(Path(args.reqif_path), tests_path, matcher, state, changed_paths)
+        expected, existing = state.expected, state.existing
+    elif args.incremental:
+        expected, digests = get_expected_structure_with_digests(args.reqif_path, matcher,
+                                                                structure_only=args.structure_only,
+                                                                layout=args.layout)
+        existing = get_existing_structure(tests_path, matcher, parse_tests=not args.structure_only,
+                                          layout=args.layout)
+        state = CoverageState(args.layout, args.structure_only, file_digest(args.reqif_path), digests,
+                              expected, existing)
+    else:
+        selector = selector_from_args(args)
+        # The expected structure is read first, it resolves the selector's paths for the directory walk.
+        expected = get_expected_structure(args.reqif_path, matcher, structure_only=args.structure_only,
+                                          selector=selector, layout=args.layout)
+        existing = get_existing_structure(tests_path, matcher, parse_tests=not args.structure_only,
+                                          selector=selector, layout=args.layout)
+
+    if state is not None:
+        state.save(state_path)
 
     differences = compare_structures(existing, expected)
-    diff_dict = {
-        'missing_folders': list(differences.missing_folders),
-        'extra_folders': list(differences.extra_folders),
-        'missing_files': list(differences.missing_files),
-        'extra_files': list(differences.extra_files),
-        'missing_tests': differences.missing_tests,
-        'extra_tests': differences.extra_tests,
-        'modified_tests': differences.modified_tests,
-        'skipped_tests': existing.skipped_test_cases,
-    }
-    print(json.dumps(diff_dict))
+    print(json.dumps(differences_to_dict(differences, existing)))
     sys.exit(0)
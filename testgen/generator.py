@@ -1,75 +1,281 @@
-import re
-from typing import List
+from typing import List, Optional
 from jinja2 import Template
 from testgen.reqif_parser import TreeNode
-from testgen.reqif_parser import ReqifParser
+from testgen.reqif_parser import ReqifParser, is_reqif_archive
+from testgen.ignore import IgnoreMatcher, load_ignore_matcher
+from testgen.layouts import (DATA_LAYOUT, DATA_RUNNER_NAME, DATA_VERSION, PlannedFile, PlannedFolder,
+                             TREE_LAYOUT, TreeLayout, add_layout_argument, get_layout, test_function_name)
+from testgen.naming import sanitize_name
+from testgen.selection import add_selection_arguments, selector_from_args
+from testgen.settings import get_settings
 import argparse
+import json
 import os
+import queue
+import threading
 from pathlib import Path
 
 
-def sanitize_name(name):
-    name.replace(" ", "_").lower()
-    return re.sub(r'\W|^(?=\d)', '_', name)
-
-
-class TestGenerator:
-    def __init__(self, nodes: list[TreeNode], path : Path, project_id: str):
-        self.nodes = nodes
-        self.path = path
-        self.project_id = project_id
-
-    def generate(self):
-        for node in self.nodes:
-            self.walk_tree(node, self.path)
-
-    def walk_tree(self,node : TreeNode, current_path: Path):
-        if node.type == "_RequirementType":
-            new_dir = current_path / sanitize_name(node.label)
-            new_dir.mkdir(parents=True, exist_ok=True)
-            for child in node.children:
-                self.walk_tree(child, new_dir)
-        elif node.type == "_TestType":
-            file_path = current_path / f"test_{sanitize_name(node.label.lower())}.py"
-            test_cases = []
-            for child in node.children:
-                if child.type == "_TestCaseType":
-                    test_cases.append(child)
-            self.generate_test_file(file_path, test_cases)
-
-    def generate_test_file(self, path: Path, test_cases: List[TreeNode]):
-
-        template = Template("""
+TEST_FILE_TEMPLATE = """
 import pytest
 
-{% for case in test_cases -%}
+{% for name, case in cases -%}
 @pytest.mark.project_id("{{ project_id }}")
 @pytest.mark.meta(id="{{ case.id }}", scenario="{{ case.description }}", steps={{ case.steps }}, prerequisites={{ case.prerequisites }})
 {% for decorator in case.generate_parametrize_decorators() -%}
 {{ decorator }}
 {% endfor -%}
 @pytest.mark.skip(reason="Not implemented yet.")
-def test_{{ case.label.replace(" ", "_").lower() }}({{ case.get_parameters_names() }}):
+def test_{{ name }}({{ case.get_parameters_names() }}):
     # TODO: Implement test and dont forget to delete @pytest.mark.skip(reason="Not implemented yet.") decorator.
     pass
 
 {% endfor -%}
-    """)
-        content = template.render(test_cases=test_cases, project_id=self.project_id)
+    """
+
+
+class TestGenerator:
+    def __init__(self, nodes: list[TreeNode], path : Path, project_id: str, matcher: IgnoreMatcher = None,
+                 layout: str = TREE_LAYOUT):
+        self.nodes = nodes
+        self.path = path
+        self.project_id = project_id
+        self.matcher = matcher if matcher is not None else IgnoreMatcher()
+        self.layout = get_layout(layout)
+        self._test_template = None
+
+    @property
+    def test_template(self) -> Template:
+        """The test file template, TEST_TEMPLATE from the settings or the built-in one, compiled once."""
+        if self._test_template is None:
+            template_path = get_settings().TEST_TEMPLATE
+            source = Path(template_path).read_text(encoding="utf-8") if template_path else TEST_FILE_TEMPLATE
+            self._test_template = Template(source)
+        return self._test_template
+
+    def plan(self):
+        return self.layout.plan(self.nodes, self.matcher)
+
+    def generate(self):
+        for item in self.plan():
+            target = self.path / item.path
+            if isinstance(item, PlannedFolder):
+                target.mkdir(parents=True, exist_ok=True)
+            elif self.layout.name == DATA_LAYOUT:
+                self.generate_data_file(target, item)
+                self.generate_data_runner(target.parent / DATA_RUNNER_NAME)
+            else:
+                self.generate_test_file(target, item.test_cases, item.function_names)
+
+    def walk_tree(self, node: TreeNode, current_path: Path):
+        """Generate the tree layout of one subtree inside ``current_path``, a folder below ``self.path``."""
+        for item in TreeLayout().plan([node], self.matcher, current_path.relative_to(self.path)):
+            target = self.path / item.path
+            if isinstance(item, PlannedFolder):
+                target.mkdir(parents=True, exist_ok=True)
+            else:
+                self.generate_test_file(target, item.test_cases, item.function_names)
+
+    def generate_test_file(self, path: Path, test_cases: List[TreeNode], function_names: List[str] = None):
+        if function_names is None:
+            function_names = [test_function_name(case) for case in test_cases]
+
+        template = self.test_template
+
+        content = template.render(cases=zip(function_names, test_cases), project_id=self.project_id)
         path.write_text(content, encoding="utf-8")
 
+    def generate_data_file(self, path: Path, planned_file: PlannedFile):
+        cases = []
+        for name, case, source in zip(planned_file.function_names, planned_file.test_cases, planned_file.sources):
+            params = {
+                'id': case.id,
+                'name': case.label,
+                'scenario': case.description,
+                'steps': case.steps,
+                'prerequisites': case.prerequisites,
+                'parameters': {parameter.name: parameter.value for parameter in case.parameters},
+            }
+            params['function'] = name
+            params['path'] = source.as_posix()
+            cases.append(params)
+        data = {"version": DATA_VERSION, "project_id": self.project_id, "cases": cases}
+        path.write_text(json.dumps(data, separators=(",", ":")), encoding="utf-8")
+
+    def generate_data_runner(self, path: Path):
+        path.write_text(DATA_RUNNER_TEMPLATE, encoding="utf-8")
+
+
+BATCH_MODE = "batch"
+STREAM_MODE = "stream"
+GENERATION_MODES = (BATCH_MODE, STREAM_MODE)
+
+
+class StreamingGenerator:
+    """
+    Generates tree layout tests while the ReqIF file is still being read.
+
+    The calling thread parses the document and lays out every node as its subtree
+    completes. Test files go through a bounded queue to ``writers`` threads that render
+    and write them. When the queue is full the parser waits for the writers, so at most
+    ``queue_size`` laid out files are waiting at any time.
+    """
+
+    def __init__(self, reqif_parser: ReqifParser, path: Path, matcher: IgnoreMatcher = None,
+                 queue_size: Optional[int] = None, writers: Optional[int] = None):
+        settings = get_settings()
+        self.reqif_parser = reqif_parser
+        self.path = path
+        self.matcher = matcher if matcher is not None else IgnoreMatcher()
+        self.queue_size = max(queue_size if queue_size is not None else settings.STREAM_QUEUE_SIZE, 1)
+        self.writers = max(writers if writers is not None else settings.STREAM_WRITERS, 1)
+
+    def generate(self):
+        header_data = self.reqif_parser.parse_header_data()
+        if header_data is None:
+            raise ValueError(f"Could not read the header of '{self.reqif_parser.file_path}'")
+        test_generator = TestGenerator([], self.path, header_data["project_id"], self.matcher)
+        # Compiled here, the writer threads only render it.
+        template = test_generator.test_template
+
+        files = queue.Queue(maxsize=self.queue_size)
+        errors = []
+        threads = [
+            threading.Thread(target=self._write_files, args=(test_generator, files, errors), daemon=True)
+            for _ in range(self.writers)
+        ]
+        for thread in threads:
+            thread.start()
+        layout = TreeLayout()
+        folders = set()
+        try:
+            for ancestors, node in self.reqif_parser.iter_hierarchy():
+                if errors:
+                    break
+                item = layout.plan_streamed(ancestors, node, self.matcher)
+                if item is None:
+                    continue
+                # Subtrees complete children first, so a file can come before its folder.
+                folder = item.path if isinstance(item, PlannedFolder) else item.path.parent
+                if folder not in folders:
+                    (self.path / folder).mkdir(parents=True, exist_ok=True)
+                    folders.add(folder)
+                if isinstance(item, PlannedFile):
+                    files.put(item)
+        finally:
+            for _ in threads:
+                files.put(None)
+            for thread in threads:
+                thread.join()
+        if errors:
+            raise errors[0]
+
+    def _write_files(self, test_generator: TestGenerator, files: queue.Queue, errors: list):
+        while True:
+            item = files.get()
+            if item is None:
+                return
+            if errors:
+                # Keep taking items so the parser never waits on a full queue.
+                continue
+            try:
+                test_generator.generate_test_file(self.path / item.path, item.test_cases, item.function_names)
+            except Exception as e:
+                errors.append(e)
+
+
+DATA_RUNNER_TEMPLATE = """import importlib.util
+import itertools
+import json
+from pathlib import Path
+
+import pytest
+
+# Generated by typhoon_testgen. Test cases are read from typhoon_cases.json,
+# implement them as case_<function>(**parameters) in typhoon_cases_impl.py.
+_HERE = Path(__file__).parent
+_DATA = json.loads((_HERE / "typhoon_cases.json").read_text(encoding="utf-8"))
+
+
+def _load_implementations():
+    path = _HERE / "typhoon_cases_impl.py"
+    if not path.exists():
+        return None
+    spec = importlib.util.spec_from_file_location("typhoon_cases_impl", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _case_params():
+    implementations = _load_implementations()
+    for case in _DATA["cases"]:
+        implementation = getattr(implementations, "case_" + case["function"], None)
+        marks = [
+            pytest.mark.project_id(_DATA["project_id"]),
+            pytest.mark.meta(id=case["id"], scenario=case["scenario"], steps=case["steps"],
+                             prerequisites=case["prerequisites"]),
+        ]
+        if implementation is None:
+            marks.append(pytest.mark.skip(reason="Not implemented yet."))
+        names = [name.replace(" ", "_") for name in case["parameters"]]
+        for values in itertools.product(*case["parameters"].values()):
+            test_id = "-".join([case["function"]] + [str(value) for value in values])
+            yield pytest.param(implementation, dict(zip(names, values)), marks=marks, id=test_id)
+
+
+@pytest.mark.parametrize("implementation, parameters", list(_case_params()))
+def test_requirement_case(implementation, parameters):
+    implementation(**parameters)
+"""
+
 def main():
     parser = argparse.ArgumentParser(description="Parse a .reqif file and generate pytest tests.")
-    parser.add_argument('file_path', type=str, help="Path to the .reqif file")
+    parser.add_argument('file_path', type=str, help="Path to the .reqif or .reqifz file")
     parser.add_argument('output_path', type=str, nargs='?', default=os.getcwd(),
                         help="Directory where tests will be generated (default: current working directory)")
+    add_selection_arguments(parser)
+    add_layout_argument(parser)
+    settings = get_settings()
+    parser.add_argument('--mode', choices=GENERATION_MODES, default=settings.GENERATION_MODE,
+                        help="batch parses the whole file before writing, stream writes test files while the "
+                             f"file is read (default: GENERATION_MODE from the settings, or {BATCH_MODE})")
+    parser.add_argument('--queue-size', type=int, default=None,
+                        help="Stream mode: test files that may wait for a writer (default: STREAM_QUEUE_SIZE)")
+    parser.add_argument('--writers', type=int, default=None,
+                        help="Stream mode: threads rendering and writing test files (default: STREAM_WRITERS)")
 
     args = parser.parse_args()
 
-    reqif_parser = ReqifParser(args.file_path)
+    if args.layout != TREE_LAYOUT and (args.only or args.exclude):
+        print(f"Error: --only and --exclude are only supported with the {TREE_LAYOUT} layout")
+        return
+
+    if args.mode not in GENERATION_MODES:
+        print(f"Error: Unknown generation mode '{args.mode}'. Expected one of: {', '.join(GENERATION_MODES)}.")
+        return
+
+    if args.mode == STREAM_MODE:
+        if args.layout != TREE_LAYOUT or args.only or args.exclude:
+            print(f"Error: {STREAM_MODE} mode only supports the {TREE_LAYOUT} layout without --only and --exclude")
+            return
+        if is_reqif_archive(args.file_path):
+            print(f"Error: {STREAM_MODE} mode reads a single .reqif file, not an archive")
+            return
+        start_path = Path(args.output_path)
+        streaming_generator = StreamingGenerator(ReqifParser(args.file_path), start_path,
+                                                 load_ignore_matcher(start_path), args.queue_size, args.writers)
+        try:
+            streaming_generator.generate()
+        except Exception as e:
+            print(f"Error generating tests: {e}")
+        return
+
+    reqif_parser = ReqifParser(args.file_path, selector=selector_from_args(args))
     data = reqif_parser.parse_reqif()
     header_data = reqif_parser.parse_header_data()
 
     start_path = Path(args.output_path)
-    test_generator = TestGenerator(data, start_path, header_data["project_id"])
+    test_generator = TestGenerator(data, start_path, header_data["project_id"], load_ignore_matcher(start_path),
+                                   args.layout)
     test_generator.generate()
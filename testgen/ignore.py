@@ -0,0 +1,71 @@
+import os
+import re
+from pathlib import Path, PurePath
+from typing import List, Union
+from gitignore_parser import rule_from_pattern
+from testgen.settings import get_settings
+
+
+class IgnoreMatcher:
+    """
+    .typhoonignore rules compiled once and matched against paths relative to the tests root.
+
+    Rules are translated with gitignore_parser, but unlike its ``parse_gitignore`` callable
+    no path is resolved against the filesystem on every call. Without negation rules all
+    patterns are joined into a single regular expression.
+    """
+
+    def __init__(self, patterns: List[str] = None):
+        rules = [rule_from_pattern(pattern.rstrip("\n")) for pattern in (patterns or [])]
+        self.rules = [rule for rule in rules if rule is not None]
+        self._has_negation = any(rule.negation for rule in self.rules)
+        if self._has_negation:
+            self._compiled = [
+                (re.compile(rule.regex), rule.negation, rule.directory_only)
+                for rule in reversed(self.rules)
+            ]
+        elif self.rules:
+            self._combined = re.compile("|".join(f"(?:{rule.regex})" for rule in self.rules))
+
+    @classmethod
+    def from_file(cls, ignore_file_path: Path) -> "IgnoreMatcher":
+        with open(ignore_file_path, "r", encoding="utf-8") as f:
+            return cls(f.readlines())
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def matches(self, rel_path: Union[str, PurePath], is_dir: bool = False) -> bool:
+        if not self.rules:
+            return False
+        path = _to_posix(rel_path)
+        if path in ("", "."):
+            return False
+        if not self._has_negation:
+            return self._combined.search(path) is not None
+        for regex, negation, directory_only in self._compiled:
+            candidate = path + "/" if negation and directory_only and is_dir else path
+            if regex.search(candidate):
+                return not negation
+        return False
+
+    def prune(self, rel_dir: Union[str, PurePath], dirs: List[str]):
+        """Remove ignored entries from an ``os.walk`` ``dirs`` list in place."""
+        if not self.rules:
+            return
+        prefix = _to_posix(rel_dir)
+        prefix = "" if prefix in ("", ".") else prefix + "/"
+        dirs[:] = [d for d in dirs if not self.matches(prefix + d, is_dir=True)]
+
+
+def _to_posix(path: Union[str, PurePath]) -> str:
+    if isinstance(path, PurePath):
+        return path.as_posix()
+    return path.replace(os.sep, "/") if os.sep != "/" else path
+
+
+def load_ignore_matcher(tests_path: Path) -> IgnoreMatcher:
+    ignore_file_path = Path(tests_path) / get_settings().IGNORE_FILE
+    if ignore_file_path.exists():
+        return IgnoreMatcher.from_file(ignore_file_path)
+    return IgnoreMatcher()
@@ -0,0 +1,160 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+from testgen.ignore import IgnoreMatcher
+from testgen.naming import sanitize_name, requirement_folder_name, test_file_name
+from testgen.reqif_parser import TreeNode, walk_preorder
+
+TREE_LAYOUT = "tree"
+MODULE_LAYOUT = "module"
+DATA_LAYOUT = "data"
+LAYOUTS = (TREE_LAYOUT, MODULE_LAYOUT, DATA_LAYOUT)
+
+DATA_FILE_NAME = "typhoon_cases.json"
+DATA_RUNNER_NAME = "test_typhoon_cases.py"
+DATA_RUNNER_FUNCTION = "test_requirement_case"
+DATA_IMPLEMENTATIONS_NAME = "typhoon_cases_impl.py"
+DATA_VERSION = 1
+
+
+def test_function_name(test_case: TreeNode) -> str:
+    """Name of the test function for a test case, without the ``test_`` prefix."""
+    return sanitize_name(test_case.label.lower())
+
+
+@dataclass
+class PlannedFolder:
+    path: Path
+
+
+@dataclass
+class PlannedFile:
+    path: Path
+    test_cases: List[TreeNode] = field(default_factory=list)
+    function_names: List[str] = field(default_factory=list)
+    # Tree layout file each test case comes from, kept for the data layout.
+    sources: List[Path] = field(default_factory=list)
+
+
+PlanItem = Union[PlannedFolder, PlannedFile]
+
+
+class TreeLayout:
+    """One folder per _RequirementType and one test file per _TestType."""
+    name = TREE_LAYOUT
+
+    def plan(self, nodes: List[TreeNode], matcher: IgnoreMatcher, root: Path = Path()) -> List[PlanItem]:
+        """Plan items for the forest below ``root``, a folder relative to the tests root."""
+        items: List[PlanItem] = []
+
+        def visit(node: TreeNode, current_path: Path):
+            item = self._plan_node(node, current_path, matcher)
+            if item is None:
+                return None
+            items.append(item)
+            return item.path if isinstance(item, PlannedFolder) else None
+
+        walk_preorder(nodes, visit, root)
+        return items
+
+    def plan_streamed(self, ancestors: Sequence[TreeNode], node: TreeNode,
+                      matcher: IgnoreMatcher) -> Optional[PlanItem]:
+        """Plan item for one node that comes with its ancestors instead of the whole forest."""
+        current_path = Path()
+        for ancestor in ancestors:
+            if ancestor.type != "_RequirementType":
+                return None
+            current_path = current_path / requirement_folder_name(ancestor.label)
+            if matcher.matches(current_path, is_dir=True):
+                return None
+        return self._plan_node(node, current_path, matcher)
+
+    @staticmethod
+    def _plan_node(node: TreeNode, current_path: Path, matcher: IgnoreMatcher) -> Optional[PlanItem]:
+        if node.type == "_RequirementType":
+            folder_path = current_path / requirement_folder_name(node.label)
+            if matcher.matches(folder_path, is_dir=True):
+                return None
+            return PlannedFolder(folder_path)
+        elif node.type == "_TestType":
+            file_path = current_path / test_file_name(node.label)
+            if matcher.matches(file_path):
+                return None
+            test_cases = [child for child in node.children if child.type == "_TestCaseType"]
+            return PlannedFile(
+                file_path,
+                test_cases,
+                [test_function_name(case) for case in test_cases],
+                [file_path] * len(test_cases)
+            )
+        return None
+
+
+def _qualified_function_name(file_path: Path, function_name: str, skip_parts: int = 0) -> str:
+    parts = [part.lower() for part in file_path.parent.parts[skip_parts:]]
+    parts.append(file_path.stem[len("test_"):])
+    parts.append(function_name)
+    return "__".join(parts)
+
+
+class ModuleLayout:
+    """
+    One test module per top-level requirement. Functions are named after the path
+    below that requirement, e.g. ``test_sub_requirement__startup__nominal_voltage``.
+    """
+    name = MODULE_LAYOUT
+
+    def plan(self, nodes: List[TreeNode], matcher: IgnoreMatcher) -> List[PlanItem]:
+        modules: Dict[Path, PlannedFile] = {}
+        for item in TreeLayout().plan(nodes, matcher):
+            if not isinstance(item, PlannedFile):
+                continue
+            if len(item.path.parts) == 1:
+                module_path = item.path
+                function_names = item.function_names
+            else:
+                module_path = Path(f"test_{item.path.parts[0].lower()}.py")
+                function_names = [_qualified_function_name(item.path, name, 1) for name in item.function_names]
+            if matcher.matches(module_path):
+                continue
+            module = modules.setdefault(module_path, PlannedFile(module_path))
+            module.test_cases.extend(item.test_cases)
+            module.function_names.extend(function_names)
+            module.sources.extend(item.sources)
+        return list(modules.values())
+
+
+class DataLayout:
+    """
+    All test cases in one generated data file, run by a single parametrized test.
+    Implementations live in ``typhoon_cases_impl.py`` as ``case_<name>`` functions.
+    """
+    name = DATA_LAYOUT
+
+    def plan(self, nodes: List[TreeNode], matcher: IgnoreMatcher) -> List[PlanItem]:
+        data_file = PlannedFile(Path(DATA_FILE_NAME))
+        for item in TreeLayout().plan(nodes, matcher):
+            if not isinstance(item, PlannedFile):
+                continue
+            data_file.test_cases.extend(item.test_cases)
+            data_file.function_names.extend(_qualified_function_name(item.path, name) for name in item.function_names)
+            data_file.sources.extend(item.sources)
+        return [data_file]
+
+
+def get_layout(name: Optional[str] = None):
+    name = name or TREE_LAYOUT
+    if name == TREE_LAYOUT:
+        return TreeLayout()
+    if name == MODULE_LAYOUT:
+        return ModuleLayout()
+    if name == DATA_LAYOUT:
+        return DataLayout()
+    raise ValueError(f"Unknown layout '{name}'. Expected one of: {', '.join(LAYOUTS)}.")
+
+
+def add_layout_argument(parser):
+    parser.add_argument('--layout', choices=LAYOUTS, default=TREE_LAYOUT,
+                        help="Layout of the generated tests: a folder per requirement and a file per test (tree), "
+                             "a module per top-level requirement (module), or a data file run by one "
+                             "parametrized test (data). Default: tree")
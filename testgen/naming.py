@@ -0,0 +1,14 @@
+import re
+
+
+def sanitize_name(name):
+    name.replace(" ", "_").lower()
+    return re.sub(r'\W|^(?=\d)', '_', name)
+
+
+def requirement_folder_name(label: str) -> str:
+    return sanitize_name(label)
+
+
+def test_file_name(label: str) -> str:
+    return f"test_{sanitize_name(label.lower())}.py"
@@ -6,6 +6,7 @@ import requests
 import pytest
 import allure
 from .settings import get_settings
+from .uploader import enqueue_upload, parse_rate, parse_size, spawn_uploader
 
 global zip_file_name
 
@@ -23,16 +24,211 @@ def pytest_addoption(parser):
         default=False,
         help='Enable uploading report to server'
     )
+    group.addoption(
+        '--upload-background',
+        action='store_true',
+        default=False,
+        help='Upload the report from a detached process so pytest exits right away (implies --upload)'
+    )
+    group.addoption(
+        '--upload-rate-limit',
+        default=None,
+        metavar='RATE',
+        help='Bandwidth cap for background uploads in bytes per second, e.g. 512K or 2M '
+             '(default: UPLOAD_RATE_LIMIT from the settings)'
+    )
+    group = parser.getgroup('requirements')
+    group.addoption(
+        '--req',
+        action='append',
+        default=[],
+        metavar='ID',
+        help='Run only the tests verifying these requirement ids (and the requirements below them)'
+    )
+    group.addoption(
+        '--req-changed-since',
+        default=None,
+        metavar='REQIF_SNAPSHOT',
+        help='Run only the tests for requirements that changed since this ReqIF snapshot'
+    )
+    group.addoption(
+        '--req-reqif',
+        default=None,
+        metavar='REQIF',
+        help='Current ReqIF for --req-changed-since (default: the ReqIF the index was built from)'
+    )
+    group.addoption(
+        '--req-index',
+        default=None,
+        metavar='PATH',
+        help='Requirement index built by typhoon_req_index '
+             '(default: REQ_INDEX_FILE from the settings, or .typhoon-req-index.json in the collected '
+             'test directories)'
+    )
+    group.addoption(
+        '--req-telemetry',
+        nargs='?',
+        const='',
+        default=None,
+        metavar='PATH',
+        help='Write test durations and outcomes per requirement to PATH '
+             '(default: typhoon-telemetry.json next to the Allure results directory)'
+    )
+
+
+class RequirementSelection:
+    def __init__(self, requirement_ids, case_ids, functions, unknown):
+        self.requirement_ids = requirement_ids
+        self.case_ids = case_ids
+        self.functions = functions
+        self.files = {file_path for file_path, _ in functions}
+        self.dirs = {parent for file_path in self.files for parent in file_path.parents}
+        self.unknown = unknown
+
+
+requirement_selection_key = pytest.StashKey[RequirementSelection]()
+
+
+def _find_requirement_index(config):
+    """
+    typhoon_req_index writes the index into the tests directory by default. Look for it in
+    each collected directory and its parents up to the rootdir, then right below it.
+    """
+    from .req_index import INDEX_FILE_NAME
+
+    rootpath = Path(config.rootpath).resolve()
+    for arg in config.args:
+        path = Path(config.invocation_params.dir, arg.split("::")[0]).resolve()
+        directory = path if path.is_dir() else path.parent
+        for candidate_dir in (directory, *directory.parents):
+            if (candidate_dir / INDEX_FILE_NAME).is_file():
+                return candidate_dir / INDEX_FILE_NAME
+            if candidate_dir == rootpath or rootpath not in candidate_dir.parents:
+                break
+        if directory.is_dir():
+            below = sorted(child / INDEX_FILE_NAME for child in directory.iterdir()
+                           if child.is_dir() and (child / INDEX_FILE_NAME).is_file())
+            if len(below) > 1:
+                raise pytest.UsageError(
+                    f"Several requirement indexes found below '{directory}', choose one with --req-index."
+                )
+            if below:
+                return below[0]
+    if (rootpath / INDEX_FILE_NAME).is_file():
+        return rootpath / INDEX_FILE_NAME
+    return None
+
+
+def _requirement_index_path(config):
+    index_path = config.getoption('req_index') or get_settings().REQ_INDEX_FILE
+    return Path(index_path) if index_path else _find_requirement_index(config)
+
+
+def _load_requirement_selection(config):
+    from .req_index import RequirementIndex, changed_requirement_ids
+
+    index_path = _requirement_index_path(config)
+    if index_path is None:
+        raise pytest.UsageError(
+            "Requirement index not found in the collected test directories, "
+            "build it with typhoon_req_index or pass --req-index."
+        )
+    if not index_path.exists():
+        raise pytest.UsageError(f"Requirement index '{index_path}' not found, build it with typhoon_req_index.")
+    index = RequirementIndex.load(index_path)
+
+    requirement_ids = set(config.getoption('req'))
+    snapshot = config.getoption('req_changed_since')
+    if snapshot:
+        current = config.getoption('req_reqif') or index.reqif
+        if not current:
+            raise pytest.UsageError("--req-changed-since needs --req-reqif or an index built with a ReqIF file.")
+        requirement_ids |= changed_requirement_ids(snapshot, current)
+
+    case_ids, functions, unknown = index.resolve(requirement_ids)
+    return RequirementSelection(requirement_ids, case_ids, functions, unknown)
+
+
+def _create_requirement_telemetry(config):
+    from .req_index import RequirementIndex
+    from .telemetry import RequirementTelemetry, TELEMETRY_FILE_NAME, hierarchy_parents
+
+    output_path = config.getoption('req_telemetry')
+    if not output_path:
+        output_path = Path(get_settings().ALLURE_RESULTS_DIR).parent / TELEMETRY_FILE_NAME
+    # The requirement index, if there is one, gives the ReqIF hierarchy of each test case.
+    # Telemetry is only a side output: without a usable index it keys test cases by path.
+    parents = None
+    try:
+        index_path = _requirement_index_path(config)
+        if index_path is not None and index_path.exists():
+            parents = hierarchy_parents(RequirementIndex.load(index_path).children)
+    except (pytest.UsageError, OSError, ValueError, KeyError) as e:
+        print(f"Requirement telemetry without the ReqIF hierarchy: {e}")
+    return RequirementTelemetry(Path(output_path), Path(config.rootpath), parents)
+
+
+@pytest.hookimpl()
+def pytest_configure(config):
+    if config.getoption('req') or config.getoption('req_changed_since'):
+        config.stash[requirement_selection_key] = _load_requirement_selection(config)
+    if config.getoption('req_telemetry') is not None:
+        config.pluginmanager.register(_create_requirement_telemetry(config), "typhoon-requirement-telemetry")
+
+
+def pytest_report_header(config):
+    selection = config.stash.get(requirement_selection_key, None)
+    if selection is None:
+        return None
+    lines = [f"requirements: {len(selection.case_ids)} test cases in {len(selection.files)} files selected"]
+    if selection.unknown:
+        lines.append(f"requirements not in the index: {', '.join(sorted(selection.unknown))}")
+    return lines
+
+
+def pytest_ignore_collect(collection_path, config):
+    selection = config.stash.get(requirement_selection_key, None)
+    if selection is None:
+        return None
+    if collection_path.is_dir():
+        return None if collection_path.resolve() in selection.dirs else True
+    name = collection_path.name
+    if collection_path.suffix == ".py" and (name.startswith("test_") or name.endswith("_test.py")):
+        return None if collection_path.resolve() in selection.files else True
+    return None
 
 
 @pytest.hookimpl()
 def pytest_sessionstart(session):
-    if session.config.getoption("report") or session.config.getoption("upload"):
+    if (session.config.getoption("report") or session.config.getoption("upload")
+            or session.config.getoption("upload_background")):
         global zip_file_name
         zip_file_name = "report"
 
-def pytest_collection_modifyitems(items):
-    if not items[0].config.getoption('report'):
+def _deselect_unrequired_items(config, items):
+    selection = config.stash[requirement_selection_key]
+    selected = []
+    deselected = []
+    for item in items:
+        meta_marker = item.get_closest_marker("meta")
+        # Cases of the data layout share one test function, they are told apart by their meta id.
+        if meta_marker and meta_marker.kwargs.get("id"):
+            required = meta_marker.kwargs["id"] in selection.case_ids
+        else:
+            required = (item.path.resolve(), getattr(item, "originalname", item.name)) in selection.functions
+        if required:
+            selected.append(item)
+        else:
+            deselected.append(item)
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+        items[:] = selected
+
+
+def pytest_collection_modifyitems(config, items):
+    if requirement_selection_key in config.stash:
+        _deselect_unrequired_items(config, items)
+    if not config.getoption('report'):
         return
     for item in items:
         meta_marker = item.get_closest_marker("meta")
@@ -91,7 +287,8 @@ def upload_allure_report(zip_name, server_url, allure_results_dir):
     server_url = server_url + "/upload"
     try:
         with open(zip_name, 'rb') as f:
-            response = requests.post(server_url, files={'file': f}, timeout=30)
+            response = requests.post(server_url, files={'file': f},
+                                     timeout=get_settings().UPLOAD_TIMEOUT)
         if response.status_code == 200:
             print("Allure ZIP file successfully uploaded to the server.")
         else:
@@ -120,16 +317,38 @@ def set_zip_file_name_to_project_id(allure_path):
             zip_file_name = "report"
 
 
+def upload_in_background(zip_name, server_url, allure_results_dir, rate_limit=None):
+    if not (allure_results_dir.exists() and allure_results_dir.is_dir()):
+        print("Allure results directory does not exist or is not a valid directory.")
+        return
+    settings = get_settings()
+    try:
+        rate = parse_rate(rate_limit if rate_limit is not None else settings.UPLOAD_RATE_LIMIT)
+        spool_dir = Path(settings.UPLOAD_SPOOL_DIR)
+        job_dir = enqueue_upload(allure_results_dir, zip_name, server_url, spool_dir, rate,
+                                 parse_size(settings.UPLOAD_SPOOL_MAX_SIZE))
+        spawn_uploader(spool_dir)
+        print(f"Report {zip_name} queued for upload as {job_dir.name}, see 'typhoon_upload status'.")
+    except Exception as e:
+        print(f"An error occurred while queueing the report for upload: {e}")
+
+
 @pytest.hookimpl()
 def pytest_sessionfinish(session, exitstatus):
-    if not session.config.getoption('upload'):
+    background = session.config.getoption('upload_background')
+    if not (session.config.getoption('upload') or background):
         return
     global zip_file_name
 
-    allure_results_dir = Path(get_settings().ALLURE_RESULTS_DIR)
+    settings = get_settings()
+    allure_results_dir = Path(settings.ALLURE_RESULTS_DIR)
     if not session.config.getoption('report'):
         set_zip_file_name_to_project_id(allure_results_dir)
     zip_file_name += ".zip"
-    upload_allure_report(zip_file_name, get_settings().SERVER_URL, allure_results_dir)
+    if background:
+        upload_in_background(zip_file_name, settings.SERVER_URL, allure_results_dir,
+                             session.config.getoption('upload_rate_limit'))
+    else:
+        upload_allure_report(zip_file_name, settings.SERVER_URL, allure_results_dir)
 
 
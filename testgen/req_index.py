@@ -0,0 +1,134 @@
+import argparse
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from testgen.coverage_check import parse_test_file
+from testgen.ignore import load_ignore_matcher
+from testgen.layouts import DATA_FILE_NAME, DATA_RUNNER_FUNCTION, DATA_RUNNER_NAME
+# changed_requirement_ids is re-exported for the pytest plugin.
+from testgen.reqif_parser import ReqifParser, iter_preorder, changed_requirement_ids
+from testgen.settings import get_settings
+
+INDEX_FILE_NAME = ".typhoon-req-index.json"
+INDEX_VERSION = 1
+
+
+def build_index(tests_path: Path, reqif_path: Optional[Path] = None) -> Dict:
+    """
+    Map requirement ids to the tests that verify them.
+
+    ``tests`` maps each test case id from ``@pytest.mark.meta(id=...)`` to its
+    ``file::function`` node ids, with files relative to the tests directory. Cases of the
+    data layout point at the shared runner function.
+    ``children`` maps requirement and test ids from the ReqIF to their child ids,
+    so a requirement resolves to every test case below it.
+    """
+    matcher = load_ignore_matcher(tests_path)
+    tests: Dict[str, List[str]] = {}
+    for root, dirs, filenames in os.walk(tests_path):
+        rel_path = Path(root).relative_to(tests_path)
+        matcher.prune(rel_path, dirs)
+        for filename in sorted(filenames):
+            if not (filename.startswith('test_') and filename.endswith('.py')):
+                continue
+            rel_file_path = rel_path / filename
+            if matcher.matches(rel_file_path):
+                continue
+            test_cases, _ = parse_test_file(Path(root) / filename, rel_file_path)
+            for name, params in test_cases.items():
+                case_id = params.get('id')
+                if case_id:
+                    tests.setdefault(case_id, []).append(f"{rel_file_path.as_posix()}::test_{name}")
+
+    data_path = tests_path / DATA_FILE_NAME
+    if data_path.exists() and not matcher.matches(Path(DATA_FILE_NAME)):
+        with open(data_path, 'r', encoding='utf-8') as f:
+            for case in json.load(f).get("cases", []):
+                tests.setdefault(case["id"], []).append(f"{DATA_RUNNER_NAME}::{DATA_RUNNER_FUNCTION}")
+
+    children: Dict[str, List[str]] = {}
+    if reqif_path is not None:
+        for node in iter_preorder(ReqifParser(reqif_path, fields=()).parse_reqif()):
+            if node.children:
+                children[node.id] = [child.id for child in node.children]
+
+    return {
+        "version": INDEX_VERSION,
+        "reqif": str(reqif_path) if reqif_path is not None else None,
+        "tests": tests,
+        "children": children,
+    }
+
+
+class RequirementIndex:
+    def __init__(self, data: Dict, base_dir: Path):
+        if data.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported requirement index version: {data.get('version')}")
+        self.base_dir = base_dir
+        self.reqif = data.get("reqif")
+        self.tests: Dict[str, List[str]] = data.get("tests", {})
+        self.children: Dict[str, List[str]] = data.get("children", {})
+
+    @classmethod
+    def load(cls, index_path: Path) -> "RequirementIndex":
+        with open(index_path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f), index_path.parent)
+
+    def resolve(self, requirement_ids: Iterable[str]) -> Tuple[Set[str], Set[Tuple[Path, str]], Set[str]]:
+        """
+        Return the test case ids below the given requirement ids, the (absolute file, function)
+        pairs implementing them and the requirement ids that are not in the index.
+        """
+        case_ids = set()
+        functions = set()
+        unknown = set()
+        seen = set()
+        stack = list(requirement_ids)
+        while stack:
+            requirement_id = stack.pop()
+            if requirement_id in seen:
+                continue
+            seen.add(requirement_id)
+            known = False
+            if requirement_id in self.tests:
+                known = True
+                case_ids.add(requirement_id)
+                for node_id in self.tests[requirement_id]:
+                    file_name, _, function_name = node_id.partition("::")
+                    functions.add(((self.base_dir / file_name).resolve(), function_name))
+            if requirement_id in self.children:
+                known = True
+                stack.extend(self.children[requirement_id])
+            if not known:
+                unknown.add(requirement_id)
+        return case_ids, functions, unknown
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the requirement to test index used by pytest --req")
+    parser.add_argument('tests_path', type=str, help="Path to the tests directory")
+    parser.add_argument('reqif_path', type=str, nargs='?', default=None,
+                        help="Path to the .reqif or .reqifz file, used to map requirements to their test cases")
+    parser.add_argument('-o', '--output', type=str, default=None,
+                        help=f"Index file to write (default: REQ_INDEX_FILE from the settings, "
+                             f"or <tests_path>/{INDEX_FILE_NAME})")
+
+    args = parser.parse_args()
+
+    tests_path = Path(args.tests_path)
+    if not tests_path.exists():
+        print(f"Error: Tests path '{tests_path}' does not exist")
+        return
+
+    reqif_path = Path(args.reqif_path).resolve() if args.reqif_path else None
+    output_path = Path(args.output or get_settings().REQ_INDEX_FILE or tests_path / INDEX_FILE_NAME)
+    index = build_index(tests_path, reqif_path)
+    if output_path.parent.resolve() != tests_path.resolve():
+        relative_tests = os.path.relpath(tests_path.resolve(), output_path.parent.resolve())
+        index["tests"] = {
+            case_id: [Path(relative_tests, node_id).as_posix() for node_id in node_ids]
+            for case_id, node_ids in index["tests"].items()
+        }
+    output_path.write_text(json.dumps(index), encoding='utf-8')
+    print(f"Indexed {len(index['tests'])} test cases into {output_path}")
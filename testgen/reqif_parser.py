@@ -1,7 +1,12 @@
-import re
+import os
+import hashlib
 import json
-from typing import Optional, List, Any
-from xml.etree import ElementTree
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, List, Any, Callable, Dict, Iterator, Iterable, Set, Tuple
+from testgen.xml_backend import get_backend, NAMESPACE, HEADER, SPEC_OBJECT, HIERARCHY, HIERARCHY_OBJECT
+from testgen.selection import RequirementSelector
+from testgen.settings import get_settings
 
 
 class Parameter:
@@ -19,19 +24,61 @@ class Parameter:
 
 class TreeNode:
     def __init__(self, identifier, label, description, node_type, priority=None, status=None,
-                 steps=None, prerequisites=None, parameters : List[Parameter] = None):
+                 steps=None, prerequisites=None, parameters : List[Parameter] = None, raw_attributes=None):
         self.id = identifier
         self.label = label
         self.description = description
         self.type = node_type
         self.priority = priority
         self.status = status
-        self.steps = steps if (steps != "" or not None) else []
-        self.prerequisites = prerequisites if (prerequisites != "" or not None) else []
-        self.parameters = parameters if parameters is not None else []
+        # Raw "_Steps", "_Prerequisites" and "_Parameters" strings as read, decoded on first access.
+        # They are kept after decoding so the node digest always hashes the same form.
+        self._raw_attributes = raw_attributes if raw_attributes is not None else {}
+        self._steps = steps if (steps != "" or not None) else []
+        self._prerequisites = prerequisites if (prerequisites != "" or not None) else []
+        self._parameters = parameters if parameters is not None else []
+        if "_Steps" in self._raw_attributes:
+            self._steps = None
+        if "_Prerequisites" in self._raw_attributes:
+            self._prerequisites = None
+        if "_Parameters" in self._raw_attributes:
+            self._parameters = None
         self.children : List[TreeNode] = []
         self.parent: Optional[TreeNode] = None
 
+    @property
+    def steps(self):
+        if self._steps is None:
+            self._steps = self._raw_attributes["_Steps"].split(",")
+        return self._steps
+
+    @steps.setter
+    def steps(self, value):
+        self._raw_attributes.pop("_Steps", None)
+        self._steps = value
+
+    @property
+    def prerequisites(self):
+        if self._prerequisites is None:
+            self._prerequisites = self._raw_attributes["_Prerequisites"].split(",")
+        return self._prerequisites
+
+    @prerequisites.setter
+    def prerequisites(self, value):
+        self._raw_attributes.pop("_Prerequisites", None)
+        self._prerequisites = value
+
+    @property
+    def parameters(self) -> List[Parameter]:
+        if self._parameters is None:
+            self._parameters = _decode_parameters(self._raw_attributes["_Parameters"])
+        return self._parameters
+
+    @parameters.setter
+    def parameters(self, value: List[Parameter]):
+        self._raw_attributes.pop("_Parameters", None)
+        self._parameters = value
+
     def add_child(self, child):
         self.children.append(child)
         child.parent = self
@@ -49,7 +96,7 @@ class TreeNode:
             names += f"{param.name.replace(' ', '_')},"
         return names[:-1]
 
-    def serialize(self):
+    def serialize_attributes(self):
         return {
             "id": self.id,
             "label": self.label,
@@ -60,11 +107,53 @@ class TreeNode:
             "steps": self.steps,
             "prerequisites": self.prerequisites,
             "parameters": [param.serialize() for param in self.parameters],  # Serialize parameters
-            "children": [child.serialize() for child in self.children]  # Recursively serialize children
         }
 
+    def serialize(self):
+        serialized = {}
+        for node in iter_postorder([self]):
+            data = node.serialize_attributes()
+            data["children"] = [serialized[id(child)] for child in node.children]
+            serialized[id(node)] = data
+        return serialized[id(self)]
+
     def __repr__(self):
-        return f"TreeNode({self.id}, {self.label}, {self.description}, {self.type}, {self.priority}, {self.status}, steps={self.steps}, parameters={self.parameters}, children={self.children})"
+        return f"TreeNode({self.id}, {self.label}, {self.description}, {self.type}, {self.priority}, {self.status}, steps={self.steps}, parameters={self.parameters}, children={[child.id for child in self.children]})"
+
+
+def iter_preorder(roots: List[TreeNode], descend: Callable[[TreeNode], bool] = None) -> Iterator[TreeNode]:
+    """Yield nodes parents first. Children of a node are skipped when ``descend(node)`` is false."""
+    stack = list(reversed(roots))
+    while stack:
+        node = stack.pop()
+        yield node
+        if descend is None or descend(node):
+            stack.extend(reversed(node.children))
+
+
+def iter_postorder(roots: List[TreeNode]) -> Iterator[TreeNode]:
+    """Yield nodes children first."""
+    stack = [(node, False) for node in reversed(roots)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            yield node
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.children))
+
+
+def walk_preorder(roots: List[TreeNode], visit: Callable[[TreeNode, Any], Any], context: Any = None):
+    """
+    Visit nodes parents first, threading a context from parent to children.
+    ``visit(node, context)`` returns the context for the node's children, or None to skip them.
+    """
+    stack = [(node, context) for node in reversed(roots)]
+    while stack:
+        node, node_context = stack.pop()
+        children_context = visit(node, node_context)
+        if children_context is not None:
+            stack.extend((child, children_context) for child in reversed(node.children))
 
 
 def _parse_parameter(raw_param):
@@ -83,158 +172,353 @@ def _parse_parameter(raw_param):
     return Parameter(name, param_type, values)
 
 
+def _decode_parameters(raw_value) -> List[Parameter]:
+    try:
+        raw_parameters = json.loads(raw_value)
+        if isinstance(raw_parameters, list):
+            return [
+                _parse_parameter(param) for param in raw_parameters
+            ]
+        else:
+            raise ValueError("Decoded '_Parameters' JSON is not a list.")
+
+    except Exception as e:
+        print(f"Error decoding parameters JSON: {e}")
+        return []
+
+
+ALL_FIELDS = frozenset({"label", "description", "priority", "status", "steps", "prerequisites", "parameters"})
+# Enough to lay out folders and test files and to name test functions.
+STRUCTURE_FIELDS = frozenset({"label"})
+
+_ATTRIBUTE_FIELDS = {
+    "_Requirement_Title": "label",
+    "_Test_Title": "label",
+    "_TestCase_Title": "label",
+    "_Requirement_Description": "description",
+    "_Test_Description": "description",
+    "_TestCase_Description": "description",
+    "_Priority": "priority",
+    "_Status": "status",
+    "_Steps": "steps",
+    "_Prerequisites": "prerequisites",
+    "_Parameters": "parameters",
+}
+_LAZY_FIELDS = frozenset({"steps", "prerequisites", "parameters"})
+
+
+# Marks a hierarchy node whose ancestors are not all known yet while streaming.
+_PENDING = object()
+
+REQIF_ARCHIVE_SUFFIX = ".reqifz"
+REQIF_SUFFIX = ".reqif"
+
+
+def is_reqif_archive(file_path) -> bool:
+    return str(file_path).lower().endswith(REQIF_ARCHIVE_SUFFIX) or zipfile.is_zipfile(file_path)
+
+
+def _parse_archive_member(archive_path, member_name, backend, fields):
+    with zipfile.ZipFile(archive_path) as archive, archive.open(member_name) as member:
+        return ReqifParser(archive_path, backend=backend, fields=fields)._parse_document(member)
+
+
 class ReqifParser:
-    def __init__(self, file_path):
+    """
+    ``fields`` is the parse profile: the TreeNode fields the caller needs, out of ALL_FIELDS.
+    Attributes outside the profile are not kept at all, and steps, prerequisites and
+    parameters are kept raw and decoded only when first accessed.
+    """
+    def __init__(self, file_path, workers: Optional[int] = None, backend: Optional[str] = None,
+                 fields: Optional[Iterable[str]] = None, selector: Optional[RequirementSelector] = None):
         self.file_path = file_path
+        self.workers = workers if workers is not None else get_settings().WORKERS
+        self.backend = backend if backend is not None else get_settings().XML_BACKEND
+        self.selector = selector
+        self.fields = frozenset(fields) if fields is not None else ALL_FIELDS
+        unknown_fields = self.fields - ALL_FIELDS
+        if unknown_fields:
+            raise ValueError(f"Unknown fields in parse profile: {', '.join(sorted(unknown_fields))}")
         self.namespace = ''
         self.spec_objects_map = {}
+        self.header_data = None
 
     def parse_reqif(self) -> list[TreeNode]:
         try:
-            tree = ElementTree.parse(self.file_path)
-            root = tree.getroot()
-            self.namespace = self._get_namespace(root)
-
-            core_content = root.find(f".//{{{self.namespace}}}CORE-CONTENT")
-            if core_content is None:
-                raise ValueError("CORE-CONTENT not found in the ReqIF file")
-
-            content = core_content.find(f"{{{self.namespace}}}REQ-IF-CONTENT")
-            if content is None:
-                raise ValueError("REQ-IF-CONTENT not found")
-
-            spec_objects = content.find(f"{{{self.namespace}}}SPEC-OBJECTS")
-            if spec_objects:
-                self._parse_spec_objects(spec_objects)
-            else:
-                raise ValueError("No SPEC-OBJECTS found in this file.")
-
-            specifications = content.find(f"{{{self.namespace}}}SPECIFICATIONS")
-            if specifications:
-                return self._parse_hierarchy(specifications)
+            if is_reqif_archive(self.file_path):
+                documents = self._parse_archive()
             else:
-                raise ValueError("No SPECIFICATIONS found in this file.")
+                documents = [self._parse_document(self.file_path)]
+
+            hierarchy = []
+            for namespace, header_data, spec_objects_map, document_hierarchy in documents:
+                self.namespace = self.namespace or namespace
+                if self.header_data is None:
+                    self.header_data = header_data
+                self.spec_objects_map.update(spec_objects_map)
+                hierarchy.append(document_hierarchy)
+
+            # Hierarchies are linked only after every document is merged, so a
+            # SPEC-HIERARCHY may reference a SPEC-OBJECT defined in another document.
+            nodes = []
+            for document_hierarchy in hierarchy:
+                self._link_hierarchy(document_hierarchy, nodes)
+            if self.selector:
+                for selector in self.selector.unmatched_selectors():
+                    print(f"Warning: Selector '{selector}' does not match any requirement")
+            return nodes
 
         except Exception as e:
             print(f"Error parsing ReqIF file: {e}")
             return []
 
-    def parse_header_data(self):
-        try:
-            tree = ElementTree.parse(self.file_path)
-            root = tree.getroot()
-            self.namespace = self._get_namespace(root)
+    def iter_hierarchy(self) -> Iterator[Tuple[Tuple[TreeNode, ...], TreeNode]]:
+        """
+        Stream a single ReqIF document instead of building the whole forest first.
+
+        Yields ``(ancestors, node)`` for every linked hierarchy node as soon as its
+        SPEC-HIERARCHY closes, so a node comes after, and together with, all of its
+        children. Nodes are linked like ``parse_reqif`` links them. When a document writes
+        OBJECT after CHILDREN, the ancestors of a node are not known when it closes and it
+        is held back until its top-level SPEC-HIERARCHY closes.
+
+        A yielded node is released when the iteration resumes: it is dropped from
+        ``spec_objects_map`` and its children are unlinked, so take what is needed from it
+        first. Spec objects not yet reached in the hierarchy are kept, SPEC-OBJECTS come
+        before SPECIFICATIONS. A spec object referenced again after it was released is an error.
+        """
+        if is_reqif_archive(self.file_path):
+            raise ValueError("Streaming reads a single .reqif document, not an archive.")
+        if self.selector is not None:
+            raise ValueError("Requirement selection needs the whole hierarchy and cannot be streamed.")
 
-            the_header = root.find(f".//{{{self.namespace}}}THE-HEADER")
-            if the_header is None:
+        self.namespace = ''
+        self.spec_objects_map = {}
+        # index -> [node, parent_index] while the node or one held back below it is open.
+        entries: Dict[int, list] = {}
+        held_back: List[int] = []
+        released: Set[str] = set()
+
+        def lookup(object_ref):
+            if object_ref in released:
+                raise ValueError(f"SPEC-OBJECT '{object_ref}' is referenced more than once in the hierarchy, "
+                                 f"which can not be streamed.")
+            return self.spec_objects_map.get(object_ref) if object_ref else None
+
+        def release(node):
+            self.spec_objects_map.pop(node.id, None)
+            released.add(node.id)
+            node.children = []
+
+        def ancestors_of(index):
+            ancestors = []
+            parent_index = entries[index][1]
+            while parent_index >= 0:
+                entry = entries.get(parent_index)
+                if entry is None:
+                    return _PENDING
+                if entry[0] is None:
+                    return None
+                ancestors.append(entry[0])
+                parent_index = entry[1]
+            return tuple(reversed(ancestors))
+
+        def link(index, ancestors):
+            node = entries[index][0]
+            if node is None or ancestors is None:
+                entries[index][0] = None
                 return None
+            if ancestors:
+                ancestors[-1].add_child(node)
+            return ancestors, node
+
+        for record in get_backend(self.backend).iter_records(self.file_path, object_refs=True):
+            kind = record[0]
+            if kind == SPEC_OBJECT:
+                self._add_spec_object(*record[1:])
+            elif kind == HIERARCHY_OBJECT:
+                _, index, parent_index, object_ref = record
+                entries[index] = [lookup(object_ref), parent_index]
+            elif kind == HIERARCHY:
+                _, index, parent_index, object_ref = record
+                if index not in entries:
+                    entries[index] = [lookup(object_ref), parent_index]
+                ancestors = ancestors_of(index)
+                if ancestors is _PENDING or held_back:
+                    held_back.append(index)
+                else:
+                    linked = link(index, ancestors)
+                    del entries[index]
+                    if linked is not None:
+                        yield linked
+                        release(linked[1])
+                if parent_index < 0:
+                    # Every object in this top-level subtree is known now.
+                    for held_index in held_back:
+                        linked = link(held_index, ancestors_of(held_index))
+                        if linked is not None:
+                            yield linked
+                            release(linked[1])
+                    held_back.clear()
+                    entries.clear()
+            elif kind == HEADER:
+                self.header_data = self._header_data(record[1])
+            elif kind == NAMESPACE:
+                self.namespace = record[1]
 
-            the_header = the_header.find(f"{{{self.namespace}}}REQ-IF-HEADER")
-
-            title = the_header.find(f"{{{self.namespace}}}TITLE")
-            title_text = title.text if title is not None else "No Title Found"
-            project_id = the_header.find(f"{{{self.namespace}}}PROJECT-ID")
-            project_text = project_id.text if project_id is not None else "No Project ID Found"
-            comment = the_header.find(f"{{{self.namespace}}}COMMENT")
-            comment_text = comment.text if comment is not None else "No Comment Found"
-
-            return {
-                "title": title_text,
-                "project_id": project_text,
-                "comment": comment_text,
-            }
+    def parse_header_data(self):
+        if self.header_data is not None:
+            return self.header_data
+        try:
+            backend = get_backend(self.backend)
+            if is_reqif_archive(self.file_path):
+                with zipfile.ZipFile(self.file_path) as archive:
+                    for member_name in self._archive_members(archive):
+                        with archive.open(member_name) as member:
+                            self.header_data = self._header_data(backend.read_header(member))
+                        if self.header_data is not None:
+                            break
+            else:
+                self.header_data = self._header_data(backend.read_header(self.file_path))
+            return self.header_data
         except Exception as e:
             print(f"Error extracting header data: {e}")
             return None
 
+    def _parse_archive(self):
+        with zipfile.ZipFile(self.file_path) as archive:
+            member_names = self._archive_members(archive)
+        if not member_names:
+            raise ValueError(f"No {REQIF_SUFFIX} documents found in the archive.")
 
-    def _parse_spec_objects(self, spec_objects_element):
-        for spec_object in spec_objects_element.findall(f"{{{self.namespace}}}SPEC-OBJECT"):
-            identifier = spec_object.get("IDENTIFIER", "")
-            spec_type = spec_object.find(f"{{{self.namespace}}}TYPE/{{{self.namespace}}}SPEC-OBJECT-TYPE-REF")
-            spec_type = spec_type.text if spec_type is not None else ""
-
-            values = spec_object.find(f"{{{self.namespace}}}VALUES")
-            label = ""
-            description = ""
-            priority = ""
-            status = ""
-            steps = []
-            prerequisites = []
-            parameters = []
-
-            if values:
-                for attr_value in values.findall(f"{{{self.namespace}}}ATTRIBUTE-VALUE-STRING"):
-                    definition_ref = attr_value.find(
-                        f"{{{self.namespace}}}DEFINITION/{{{self.namespace}}}ATTRIBUTE-DEFINITION-STRING-REF").text
-                    the_value = attr_value.get("THE-VALUE", "")
-
-                    if definition_ref == "_Requirement_Title" or definition_ref == "_Test_Title" or definition_ref == "_TestCase_Title":
-                        label = the_value
-                    elif definition_ref == "_Requirement_Description" or definition_ref == "_Test_Description" or definition_ref == "_TestCase_Description":
-                        description = the_value
-                    elif definition_ref == "_Priority":
-                        priority = the_value
-                    elif definition_ref == "_Status":
-                        status = the_value
-                    elif definition_ref == "_Steps":
-                        steps = the_value.split(",")
-                    elif definition_ref == "_Prerequisites":
-                        prerequisites = the_value.split(",")
-                    elif definition_ref == "_Parameters":
-                        try:
-                            raw_parameters = json.loads(the_value)
-                            if isinstance(raw_parameters, list):
-                                parameters = [
-                                    _parse_parameter(param) for param in raw_parameters
-                                ]
-                            else:
-                                raise ValueError("Decoded '_Parameters' JSON is not a list.")
-
-                        except Exception as e:
-                            print(f"Error decoding parameters JSON: {e}")
-            node = TreeNode(
-                identifier,
-                label,
-                description,
-                spec_type,
-                priority,
-                status,
-                steps=steps,
-                prerequisites=prerequisites,
-                parameters=parameters
-            )
-
-            self.spec_objects_map[identifier] = node
-
-    def _parse_hierarchy(self, specifications_element):
-        nodes = []
-        for specification in specifications_element.findall(f"{{{self.namespace}}}SPECIFICATION"):
-            children = specification.find(f"{{{self.namespace}}}CHILDREN")
-            if children:
-                for hierarchy in children.findall(f"{{{self.namespace}}}SPEC-HIERARCHY"):
-                    self._build_hierarchy(hierarchy, None, nodes)
-        return nodes
-
-    def _build_hierarchy(self, hierarchy, parent, nodes):
-        object_ref = hierarchy.find(f"{{{self.namespace}}}OBJECT/{{{self.namespace}}}SPEC-OBJECT-REF")
-        object_ref = object_ref.text if object_ref is not None else None
-
-        if object_ref and object_ref in self.spec_objects_map:
-            node = self.spec_objects_map[object_ref]
+        workers = self.workers or os.cpu_count() or 1
+        workers = min(workers, len(member_names))
+        if workers <= 1:
+            return [_parse_archive_member(self.file_path, name, self.backend, self.fields) for name in member_names]
 
-            if parent:
-                parent.add_child(node)
-            else:
-                nodes.append(node)
+        count = len(member_names)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(
+                _parse_archive_member,
+                [self.file_path] * count, member_names, [self.backend] * count, [self.fields] * count
+            ))
 
-            children = hierarchy.find(f"{{{self.namespace}}}CHILDREN")
-            if children:
-                for child_hierarchy in children.findall(f"{{{self.namespace}}}SPEC-HIERARCHY"):
-                    self._build_hierarchy(child_hierarchy, node, nodes)
+    @staticmethod
+    def _archive_members(archive: zipfile.ZipFile) -> List[str]:
+        return [
+            info.filename for info in archive.infolist()
+            if not info.is_dir() and info.filename.lower().endswith(REQIF_SUFFIX)
+        ]
+
+    def _parse_document(self, source):
+        """
+        Parse one ReqIF document into picklable parts: its namespace, header data,
+        spec objects and a flat pre-ordered list of (object_ref, parent_index) hierarchy entries.
+        """
+        self.namespace = ''
+        self.spec_objects_map = {}
+        header_data = None
+        hierarchy = []
+
+        for record in get_backend(self.backend).iter_records(source):
+            kind = record[0]
+            if kind == SPEC_OBJECT:
+                self._add_spec_object(*record[1:])
+            elif kind == HIERARCHY:
+                _, index, parent_index, object_ref = record
+                if index >= len(hierarchy):
+                    hierarchy.extend([None] * (index + 1 - len(hierarchy)))
+                hierarchy[index] = (object_ref, parent_index)
+            elif kind == HEADER:
+                header_data = self._header_data(record[1])
+            elif kind == NAMESPACE:
+                self.namespace = record[1]
+
+        return self.namespace, header_data, self.spec_objects_map, hierarchy
 
     @staticmethod
-    def _get_namespace(element):
-        match = re.match(r'\{(.*)}', element.tag)
-        return match.group(1) if match else ''
+    def _header_data(raw_header):
+        if raw_header is None:
+            return None
+        return {
+            "title": raw_header["title"] if raw_header["title"] is not None else "No Title Found",
+            "project_id": raw_header["project_id"] if raw_header["project_id"] is not None else "No Project ID Found",
+            "comment": raw_header["comment"] if raw_header["comment"] is not None else "No Comment Found",
+        }
 
+    def _add_spec_object(self, identifier, spec_type, attributes):
+        values = {
+            "label": "",
+            "description": "",
+            "priority": "",
+            "status": "",
+        }
+        raw_attributes = {}
+
+        for definition_ref, the_value in attributes:
+            field = _ATTRIBUTE_FIELDS.get(definition_ref)
+            if field is None or field not in self.fields:
+                continue
+            if field in _LAZY_FIELDS:
+                raw_attributes[definition_ref] = the_value
+            else:
+                values[field] = the_value
+
+        node = TreeNode(
+            identifier,
+            values["label"],
+            values["description"],
+            spec_type,
+            values["priority"],
+            values["status"],
+            steps=[],
+            prerequisites=[],
+            parameters=[],
+            raw_attributes=raw_attributes
+        )
+
+        self.spec_objects_map[identifier] = node
+
+    def _link_hierarchy(self, hierarchy, nodes):
+        keep = self.selector.select(hierarchy, self.spec_objects_map) if self.selector else None
+        linked: List[Optional[TreeNode]] = []
+        for index, (object_ref, parent_index) in enumerate(hierarchy):
+            parent = linked[parent_index] if parent_index >= 0 else None
+            node = self.spec_objects_map.get(object_ref) if object_ref else None
+            if node is None or (parent_index >= 0 and parent is None) or (keep is not None and not keep[index]):
+                linked.append(None)
+                continue
+            if parent:
+                parent.add_child(node)
+            else:
+                nodes.append(node)
+            linked.append(node)
+
+
+def _node_digest(node: TreeNode) -> str:
+    # Steps, prerequisites and parameters read from the ReqIF are hashed as read, decoded or not.
+    raw = node._raw_attributes
+    signature = [
+        node.type,
+        node.label,
+        node.description,
+        node.priority,
+        node.status,
+        raw.get("_Steps", node._steps),
+        raw.get("_Prerequisites", node._prerequisites),
+        raw["_Parameters"] if "_Parameters" in raw else [param.serialize() for param in node._parameters],
+        node.parent.id if node.parent is not None else None,
+    ]
+    return hashlib.blake2b(json.dumps(signature).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def requirement_digests(roots: List[TreeNode]) -> Dict[str, str]:
+    """A short digest of every node's attributes and parent, by node id."""
+    return {node.id: _node_digest(node) for node in iter_preorder(roots)}
+
+
+def changed_requirement_ids(snapshot_path, current_path) -> Set[str]:
+    """Ids of spec objects that are new in ``current_path`` or differ from ``snapshot_path``."""
+    previous = requirement_digests(ReqifParser(snapshot_path).parse_reqif())
+    current = requirement_digests(ReqifParser(current_path).parse_reqif())
+    return {node_id for node_id, digest in current.items() if previous.get(node_id) != digest}
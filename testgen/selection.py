@@ -0,0 +1,150 @@
+import os
+from pathlib import PurePath
+from typing import Iterable, List, Optional, Tuple, Union
+from testgen.naming import requirement_folder_name, test_file_name
+
+IN_SCOPE = "in"
+ANCESTOR = "ancestor"
+OUT_OF_SCOPE = "out"
+
+
+def _normalize_path(path: Union[str, PurePath]) -> str:
+    if isinstance(path, PurePath):
+        path = path.as_posix()
+    path = path.replace(os.sep, "/").replace("\\", "/").strip().strip("/").lower()
+    return "" if path == "." else path
+
+
+def _within(path: str, root: str) -> bool:
+    return root == "" or path == root or path.startswith(root + "/")
+
+
+def node_path_segment(node) -> Optional[str]:
+    if node.type == "_RequirementType":
+        return requirement_folder_name(node.label)
+    if node.type == "_TestType":
+        return test_file_name(node.label)
+    return None
+
+
+class RequirementSelector:
+    """
+    Restricts a run to part of the specification.
+
+    Selectors are requirement IDENTIFIERs or sanitized paths relative to the tests root,
+    e.g. ``Power/Inverter`` or ``Power/Inverter/test_startup.py``. A selected test case
+    selects the whole test file it belongs to. With ``only``, requirements above a
+    selected node are kept as context so the folder layout stays the same, but their
+    other children are dropped. ``exclude`` removes whole subtrees and wins over ``only``.
+    """
+
+    def __init__(self, only: Iterable[str] = None, exclude: Iterable[str] = None):
+        self.only = {selector.strip() for selector in only or []}
+        self.exclude = {selector.strip() for selector in exclude or []}
+        self._only_paths = {_normalize_path(selector) for selector in self.only}
+        self._exclude_paths = {_normalize_path(selector) for selector in self.exclude}
+        self.included_paths: List[str] = []
+        self.excluded_paths: List[str] = []
+        self._matched_ids = set()
+        self._matched_paths = set()
+
+    def __bool__(self):
+        return bool(self.only or self.exclude)
+
+    def select(self, hierarchy: List[Tuple[Optional[str], int]], spec_objects_map) -> List[bool]:
+        """
+        Decide which entries of a flat, pre-ordered (object_ref, parent_index) hierarchy are kept.
+        Paths of the selected and excluded subtrees are recorded for ``path_scope``.
+        """
+        nodes = [spec_objects_map.get(object_ref) if object_ref else None for object_ref, _ in hierarchy]
+
+        # A test case selector selects the test that owns it.
+        only_by_child = set()
+        exclude_by_child = set()
+        for index, (node, (_, parent_index)) in enumerate(zip(nodes, hierarchy)):
+            if node is not None and parent_index >= 0 and node.type == "_TestCaseType":
+                if node.id in self.only:
+                    only_by_child.add(parent_index)
+                if node.id in self.exclude:
+                    exclude_by_child.add(parent_index)
+
+        paths: List[Optional[str]] = []
+        inside: List[bool] = []
+        excluded: List[bool] = []
+        for index, (node, (_, parent_index)) in enumerate(zip(nodes, hierarchy)):
+            has_parent = parent_index >= 0
+            if node is None or (has_parent and paths[parent_index] is None):
+                paths.append(None)
+                inside.append(False)
+                excluded.append(True)
+                continue
+            parent_path = paths[parent_index] if has_parent else ""
+            segment = node_path_segment(node)
+            path = f"{parent_path}/{segment}" if parent_path and segment else (segment or parent_path)
+            paths.append(path)
+            if node.id in self.only or node.id in self.exclude:
+                self._matched_ids.add(node.id)
+            if path.lower() in self._only_paths or path.lower() in self._exclude_paths:
+                self._matched_paths.add(path.lower())
+
+            is_test_case = node.type == "_TestCaseType"
+            parent_excluded = has_parent and excluded[parent_index]
+            node_excluded = not is_test_case and self._matches(node, path, self.exclude, self._exclude_paths)
+            node_excluded = node_excluded or index in exclude_by_child
+            excluded.append(parent_excluded or node_excluded)
+            if node_excluded and not parent_excluded:
+                self.excluded_paths.append(path.lower())
+
+            parent_inside = (has_parent and inside[parent_index]) or not self.only
+            node_selected = not is_test_case and self._matches(node, path, self.only, self._only_paths)
+            node_selected = node_selected or index in only_by_child
+            inside.append(parent_inside or node_selected)
+            if node_selected and not parent_inside and not excluded[index]:
+                self.included_paths.append(path.lower())
+
+        keep = [is_inside and not is_excluded for is_inside, is_excluded in zip(inside, excluded)]
+        # Ancestors of kept entries are kept as context for the folder layout.
+        for index in range(len(hierarchy) - 1, -1, -1):
+            parent_index = hierarchy[index][1]
+            if keep[index] and parent_index >= 0:
+                keep[parent_index] = True
+        return keep
+
+    def unmatched_selectors(self) -> List[str]:
+        """
+        Selectors that matched no node in any hierarchy passed to ``select`` so far.
+        """
+        return sorted(selector for selector in self.only | self.exclude
+                      if selector not in self._matched_ids and _normalize_path(selector) not in self._matched_paths)
+
+    def path_scope(self, rel_path: Union[str, PurePath]) -> str:
+        """
+        Classify a path relative to the tests root: IN_SCOPE if it belongs to a selected
+        subtree, ANCESTOR if it only leads to one, OUT_OF_SCOPE otherwise.
+        Only meaningful after ``select`` has run.
+        """
+        path = _normalize_path(rel_path)
+        if any(_within(path, excluded_path) for excluded_path in self.excluded_paths):
+            return OUT_OF_SCOPE
+        if not self.only:
+            return IN_SCOPE
+        if any(_within(path, included_path) for included_path in self.included_paths):
+            return IN_SCOPE
+        if any(_within(included_path, path) for included_path in self.included_paths):
+            return ANCESTOR
+        return OUT_OF_SCOPE
+
+    @staticmethod
+    def _matches(node, path: str, selectors, path_selectors) -> bool:
+        return node.id in selectors or path.lower() in path_selectors
+
+
+def add_selection_arguments(parser):
+    parser.add_argument('--only', nargs='+', action='extend', default=[], metavar='SELECTOR',
+                        help="Process only these requirement IDENTIFIERs or sanitized paths")
+    parser.add_argument('--exclude', nargs='+', action='extend', default=[], metavar='SELECTOR',
+                        help="Skip these requirement IDENTIFIERs or sanitized paths")
+
+
+def selector_from_args(args) -> RequirementSelector:
+    return RequirementSelector(only=args.only, exclude=args.exclude)
@@ -1,14 +1,109 @@
+import os
 from functools import lru_cache
-from pydantic_settings import BaseSettings
+from pathlib import Path
+from typing import Dict, Optional
 
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
 
-class Settings(BaseSettings):
-    ALLURE_RESULTS_DIR: str = "allure-html"
-    SERVER_URL: str = "http://localhost:8000"
+PYPROJECT_SECTION = "typhoon-testgen"
+ENV_FILE_NAME = ".env"
+
+
+def _optional_int(value) -> Optional[int]:
+    if value is None or str(value).strip() == "":
+        return None
+    return int(value)
+
+
+# name: (converter, default). Values come from the environment, then .env, then the
+# [tool.typhoon-testgen] table of pyproject.toml (keys in lower case), then the default.
+_FIELDS = {
+    "ALLURE_RESULTS_DIR": (str, "allure-html"),
+    "SERVER_URL": (str, "http://localhost:8000"),
+    # Worker processes for archive parsing and typhoon_batch, empty for one per CPU.
+    "WORKERS": (_optional_int, None),
+    # ReqIF XML backend: auto, stdlib or lxml.
+    "XML_BACKEND": (str, "auto"),
+    # typhoon_testgen mode: batch parses the whole file first, stream writes tests while reading it.
+    "GENERATION_MODE": (str, "batch"),
+    # Test files waiting to be written and writer threads in stream mode.
+    "STREAM_QUEUE_SIZE": (int, 64),
+    "STREAM_WRITERS": (int, 1),
+    "IGNORE_FILE": (str, ".typhoonignore"),
+    # Jinja template for generated test files, empty for the built-in one. typhoon_test_update only
+    # uses it for new files: existing ones are merged with its own template to keep implemented tests.
+    "TEST_TEMPLATE": (str, ""),
+    # Requirement index and coverage state files, empty for the default inside the tests directory.
+    "REQ_INDEX_FILE": (str, ""),
+    "COVERAGE_STATE_FILE": (str, ""),
+    "UPLOAD_SPOOL_DIR": (str, ".typhoon-upload-spool"),
+    # Largest spool size, like 2G. The oldest pending uploads are dropped above it. Empty for no limit.
+    "UPLOAD_SPOOL_MAX_SIZE": (str, ""),
+    "UPLOAD_RATE_LIMIT": (str, ""),
+    "UPLOAD_CHUNK_SIZE": (int, 64 * 1024),
+    "UPLOAD_TIMEOUT": (int, 30),
+}
+
+
+def find_pyproject(start: Path) -> Optional[Path]:
+    for directory in (start, *start.parents):
+        candidate = directory / "pyproject.toml"
+        if candidate.is_file():
+            return candidate
+    return None
+
+
+def _read_pyproject(pyproject_path: Optional[Path]) -> Dict:
+    if pyproject_path is None or tomllib is None:
+        return {}
+    with open(pyproject_path, "rb") as f:
+        table = tomllib.load(f).get("tool", {}).get(PYPROJECT_SECTION, {})
+    return {key.upper(): value for key, value in table.items()}
+
+
+def _read_env_file(env_path: Path) -> Dict:
+    if not env_path.is_file():
+        return {}
+    from dotenv import dotenv_values
+    return {key: value for key, value in dotenv_values(env_path).items() if value is not None}
+
+
+class Settings:
+    """
+    Configuration shared by the plugin and the command line tools.
+
+    Sources are read once, when the settings are created: the environment wins over
+    ``.env`` in the current directory, which wins over ``[tool.typhoon-testgen]`` in the
+    nearest pyproject.toml.
+    """
+
+    def __init__(self, environ=None, env_file: Optional[Path] = None, pyproject: Optional[Path] = None):
+        cwd = Path.cwd()
+        environ = os.environ if environ is None else environ
+        pyproject_values = _read_pyproject(pyproject if pyproject is not None else find_pyproject(cwd))
+        env_file_values = _read_env_file(env_file if env_file is not None else cwd / ENV_FILE_NAME)
+        for name, (convert, default) in _FIELDS.items():
+            for source in (environ, env_file_values, pyproject_values):
+                if name in source:
+                    try:
+                        value = convert(source[name])
+                    except (TypeError, ValueError):
+                        raise ValueError(f"Invalid value for setting {name}: {source[name]!r}")
+                    break
+            else:
+                value = default
+            setattr(self, name, value)
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in _FIELDS)
+        return f"Settings({values})"
 
-    class Config:
-        env_file = ".env"
-        env_file_encoding = "utf-8"
 
 @lru_cache()
 def get_settings():
@@ -0,0 +1,201 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import pytest
+
+TELEMETRY_FILE_NAME = "typhoon-telemetry.json"
+TELEMETRY_VERSION = 1
+
+PHASES = ("setup", "call", "teardown")
+OUTCOMES = ("passed", "failed", "skipped")
+# Layout of the per-test counters: executions, outcomes, then phase durations.
+_RUNS = 0
+_OUTCOME_SLOTS = {outcome: 1 + index for index, outcome in enumerate(OUTCOMES)}
+_PHASE_SLOTS = {phase: 1 + len(OUTCOMES) + index for index, phase in enumerate(PHASES)}
+_SLOTS = 1 + len(OUTCOMES) + len(PHASES)
+
+
+def _new_stats() -> List[float]:
+    return [0] * _SLOTS
+
+
+def _stats_to_dict(stats: List[float]) -> Dict:
+    data = {"runs": stats[_RUNS]}
+    for outcome, slot in _OUTCOME_SLOTS.items():
+        data[outcome] = stats[slot]
+    for phase, slot in _PHASE_SLOTS.items():
+        data[phase] = round(stats[slot], 6)
+    return data
+
+
+def _requirement_id(item) -> Optional[str]:
+    meta_marker = item.get_closest_marker("meta")
+    if meta_marker is not None:
+        return meta_marker.kwargs.get("id")
+    # With --report the meta marker has already been moved to the user properties.
+    for name, value in item.user_properties:
+        if name == "internal_meta":
+            return value.get("id")
+    return None
+
+
+def hierarchy_parents(children: Dict[str, List[str]]) -> Dict[str, str]:
+    return {child: parent for parent, child_ids in children.items() for child in child_ids}
+
+
+class RequirementTelemetry:
+    """
+    Aggregates test durations and outcomes by requirement id and by hierarchy path.
+    Registered as a pytest plugin by the typhoon plugin when ``--req-telemetry`` is given.
+
+    Tests are mapped to their requirement once, at collection. Each report then only adds
+    to a preallocated counter list, and hierarchy totals are rolled up when the summary is
+    built. Hierarchy paths come from the requirement index when there is one, otherwise
+    from the location of the test file.
+    """
+
+    def __init__(self, output_path: Path, root_path: Path, parents: Optional[Dict[str, str]] = None):
+        self.output_path = output_path
+        self.root_path = root_path
+        self.parents = parents or {}
+        self._tests: Dict[str, Tuple[str, List[float]]] = {}
+        self._paths: Dict[str, Tuple[str, ...]] = {}
+        self._by_requirement: Dict[str, List[float]] = {}
+        self._outcomes: Dict[str, str] = {}
+
+    def _hierarchy_path(self, requirement_id: str, rel_file: Path) -> Tuple[str, ...]:
+        if requirement_id in self.parents:
+            path = [requirement_id]
+            seen = {requirement_id}
+            while path[-1] in self.parents and self.parents[path[-1]] not in seen:
+                path.append(self.parents[path[-1]])
+                seen.add(path[-1])
+            return tuple(reversed(path))
+        return rel_file.parent.parts + (rel_file.stem, requirement_id)
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_collection_modifyitems(self, items):
+        # trylast, so tests deselected by other plugins are not registered.
+        for item in items:
+            requirement_id = _requirement_id(item)
+            if not requirement_id:
+                continue
+            stats = self._by_requirement.get(requirement_id)
+            if stats is None:
+                stats = self._by_requirement[requirement_id] = _new_stats()
+                try:
+                    rel_file = Path(item.path).relative_to(self.root_path)
+                except ValueError:
+                    rel_file = Path(Path(item.path).name)
+                self._paths[requirement_id] = self._hierarchy_path(requirement_id, rel_file)
+            self._tests[item.nodeid] = (requirement_id, stats)
+
+    def pytest_runtest_logreport(self, report):
+        test = self._tests.get(report.nodeid)
+        if test is None:
+            return
+        _, stats = test
+        stats[_PHASE_SLOTS[report.when]] += report.duration
+        nodeid = report.nodeid
+        if report.failed:
+            self._outcomes[nodeid] = "failed"
+        elif report.skipped and nodeid not in self._outcomes:
+            self._outcomes[nodeid] = "skipped"
+        if report.when == "teardown":
+            stats[_RUNS] += 1
+            stats[_OUTCOME_SLOTS[self._outcomes.pop(nodeid, "passed")]] += 1
+
+    def summary(self) -> Dict:
+        by_path: Dict[str, List[float]] = {}
+        for requirement_id, stats in self._by_requirement.items():
+            if not stats[_RUNS]:
+                continue
+            parts = self._paths[requirement_id]
+            for depth in range(1, len(parts) + 1):
+                totals = by_path.setdefault("/".join(parts[:depth]), _new_stats())
+                for slot in range(_SLOTS):
+                    totals[slot] += stats[slot]
+        return {
+            "version": TELEMETRY_VERSION,
+            "created": time.time(),
+            "requirements": {
+                requirement_id: _stats_to_dict(stats)
+                for requirement_id, stats in sorted(self._by_requirement.items())
+                if stats[_RUNS]
+            },
+            "paths": {path: _stats_to_dict(stats) for path, stats in sorted(by_path.items())},
+        }
+
+    def write(self):
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        self.output_path.write_text(json.dumps(self.summary(), separators=(',', ':')), encoding='utf-8')
+
+    def pytest_sessionfinish(self):
+        self.write()
+
+    def pytest_terminal_summary(self, terminalreporter):
+        terminalreporter.write_line(f"requirement telemetry: {self.output_path}")
+
+
+def load_summary(summary_path: Path) -> Dict:
+    with open(summary_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get("version") != TELEMETRY_VERSION:
+        raise ValueError(f"Unsupported telemetry version: {data.get('version')}")
+    return data
+
+
+def _mean_duration(stats: Dict) -> float:
+    return sum(stats[phase] for phase in PHASES) / stats["runs"] if stats["runs"] else 0.0
+
+
+def compare_summaries(baseline: Dict, current: Dict, section: str = "requirements", threshold: float = 0.2,
+                      min_seconds: float = 0.1) -> List[Dict]:
+    """
+    Entries whose mean verification time per run grew by more than ``threshold`` (relative)
+    and ``min_seconds`` (absolute), slowest growth first.
+    """
+    regressions = []
+    baseline_entries = baseline.get(section, {})
+    for key, stats in current.get(section, {}).items():
+        if key not in baseline_entries:
+            continue
+        before = _mean_duration(baseline_entries[key])
+        after = _mean_duration(stats)
+        if after - before >= min_seconds and after > before * (1 + threshold):
+            regressions.append({
+                "id": key,
+                "baseline": round(before, 6),
+                "current": round(after, 6),
+                "change": round((after - before) / before, 4) if before else None,
+                "failed": stats["failed"],
+            })
+    regressions.sort(key=lambda entry: entry["current"] - entry["baseline"], reverse=True)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare requirement telemetry summaries to find slower requirements")
+    parser.add_argument('baseline', type=str, help="Telemetry summary of the reference run")
+    parser.add_argument('current', type=str, help="Telemetry summary of the run to check")
+    parser.add_argument('--by', choices=("requirements", "paths"), default="requirements",
+                        help="Compare by requirement id or by hierarchy path (default: requirements)")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Relative growth of the mean time per run that counts as a regression (default: 0.2)")
+    parser.add_argument('--min-seconds', type=float, default=0.1,
+                        help="Ignore growth smaller than this many seconds per run (default: 0.1)")
+
+    args = parser.parse_args()
+
+    for path in (args.baseline, args.current):
+        if not Path(path).exists():
+            print(f"Error: Telemetry summary '{path}' does not exist")
+            return
+
+    regressions = compare_summaries(load_summary(Path(args.baseline)), load_summary(Path(args.current)),
+                                    args.by, args.threshold, args.min_seconds)
+    print(json.dumps({"regressions": regressions}))
+    sys.exit(1 if regressions else 0)
@@ -3,40 +3,52 @@ from pathlib import Path
 from typing import List
 from jinja2 import Template
 from testgen import ReqifParser, TreeNode
-from testgen.generator import TestGenerator, sanitize_name
-from gitignore_parser import parse_gitignore
-
-
-def update_tests(test_generator: TestGenerator, matches):
-    path = test_generator.path
-    for node in test_generator.nodes:
-        update_requirement_node(node, test_generator, path, matches)
-
-
-def update_requirement_node(node, test_generator: TestGenerator, path: Path, matches):
-    if node.type == "_RequirementType":
-        folder_path = Path.joinpath(path, sanitize_name(node.label))
-        if not folder_path.exists():
-            if not matches(folder_path):
-                folder_path.mkdir(parents=True, exist_ok=True)
-        for child in node.children:
-            update_requirement_node(child, test_generator, folder_path, matches)
-    elif node.type == "_TestType":
-        file_path = Path.joinpath(path, f"test_{sanitize_name(node.label)}.py")
-        if matches(file_path):
-            return
-        test_cases = []
-        for child in node.children:
-            if child.type == "_TestCaseType":
-                test_cases.append(child)
-        if not file_path.exists():
-            file_path.touch()
-            test_generator.generate_test_file(file_path, test_cases)
+from testgen.generator import TestGenerator
+from testgen.ignore import IgnoreMatcher, load_ignore_matcher
+from testgen.layouts import (DATA_LAYOUT, DATA_RUNNER_NAME, PlannedFolder, TREE_LAYOUT, TreeLayout,
+                             add_layout_argument, test_function_name)
+from testgen.selection import add_selection_arguments, selector_from_args
+
+
+def update_tests(test_generator: TestGenerator, matcher: IgnoreMatcher):
+    for item in test_generator.layout.plan(test_generator.nodes, matcher):
+        target = test_generator.path / item.path
+        if isinstance(item, PlannedFolder):
+            target.mkdir(parents=True, exist_ok=True)
+        elif test_generator.layout.name == DATA_LAYOUT:
+            # The data file is regenerated, implementations live next to it and are kept.
+            test_generator.generate_data_file(target, item)
+            runner_path = target.parent / DATA_RUNNER_NAME
+            if not runner_path.exists():
+                test_generator.generate_data_runner(runner_path)
+        elif not target.exists():
+            test_generator.generate_test_file(target, item.test_cases, item.function_names)
         else:
-            update_test_file(file_path, test_cases, test_generator)
+            update_test_file(target, item.test_cases, test_generator, item.function_names)
 
 
-def update_test_file(file_path: Path, test_cases: List[TreeNode], test_generator: TestGenerator):
+def update_requirement_node(node, test_generator: TestGenerator, path: Path, matcher: IgnoreMatcher):
+    """Update the tree layout of one subtree inside ``path``, a folder below ``test_generator.path``."""
+    for item in TreeLayout().plan([node], matcher, path.relative_to(test_generator.path)):
+        target = test_generator.path / item.path
+        if isinstance(item, PlannedFolder):
+            target.mkdir(parents=True, exist_ok=True)
+        elif not target.exists():
+            test_generator.generate_test_file(target, item.test_cases, item.function_names)
+        else:
+            update_test_file(target, item.test_cases, test_generator, item.function_names)
+
+
+def update_test_file(file_path: Path, test_cases: List[TreeNode], test_generator: TestGenerator,
+                     function_names: List[str] = None):
+    """
+    Rewrite an existing test file for the current test cases, keeping the bodies of its test
+    functions and the functions that are no longer in the ReqIF. It is rendered with its own
+    template, not TEST_TEMPLATE, which has no place for the kept bodies.
+    """
+    if function_names is None:
+        function_names = [test_function_name(case) for case in test_cases]
+
     with open(file_path, 'r', encoding='utf-8') as f:
         content = f.read()
 
@@ -87,14 +99,14 @@ def update_test_file(file_path: Path, test_cases: List[TreeNode], test_generator
             'full_block': '\n'.join(full_func_block)
         }
 
-    test_case_names = [f"test_{case.label.lower().replace(' ', '_')}" for case in test_cases]
+    test_case_names = [f"test_{name}" for name in function_names]
 
     update_template = Template("""import pytest
 
 {% for case in test_cases -%}
 @pytest.mark.project_id("{{ project_id }}")
 @pytest.mark.meta(id="{{ case.id }}", scenario="{{ case.description }}", steps="{{ case.steps }}", prerequisites="{{ case.prerequisites }}")
-{%- set func_name = "test_" ~ case.label.replace(" ", "_") -%}
+{%- set func_name = test_case_names[loop.index0] -%}
 {%- for decorator in case.generate_parametrize_decorators() %}
 {{ decorator }}
 {%- endfor %}
@@ -129,19 +141,16 @@ def {{ func_name.lower() }}({{ case.get_parameters_names() }}):
 
 def main():
     parser = argparse.ArgumentParser(description="Check test coverage against reqif file")
-    parser.add_argument('reqif_path', type=str, help="Path to the .reqif file")
+    parser.add_argument('reqif_path', type=str, help="Path to the .reqif or .reqifz file")
     parser.add_argument('tests_path', type=str, help="Path to the tests directory")
+    add_selection_arguments(parser)
+    add_layout_argument(parser)
 
     args = parser.parse_args()
 
     reqif_path = Path(args.reqif_path)
     tests_path = Path(args.tests_path)
 
-    ignore_file_path = tests_path / '.typhoonignore'
-    matches = None
-    if ignore_file_path.exists():
-        matches = parse_gitignore(ignore_file_path, base_dir=tests_path)
-
     if not reqif_path.exists():
         print(f"Error: Reqif path '{reqif_path}' does not exist")
         return
@@ -150,10 +159,15 @@ def main():
         print(f"Error: Tests path '{tests_path}' does not exist")
         return
 
-    reqif_parser = ReqifParser(reqif_path)
+    if args.layout != TREE_LAYOUT and (args.only or args.exclude):
+        print(f"Error: --only and --exclude are only supported with the {TREE_LAYOUT} layout")
+        return
+
+    reqif_parser = ReqifParser(reqif_path, selector=selector_from_args(args))
     data = reqif_parser.parse_reqif()
     header_data = reqif_parser.parse_header_data()
 
-    test_generator = TestGenerator(data, tests_path, header_data["project_id"])
+    matcher = load_ignore_matcher(tests_path)
+    test_generator = TestGenerator(data, tests_path, header_data["project_id"], matcher, args.layout)
 
-    update_tests(test_generator, matches)
+    update_tests(test_generator, matcher)
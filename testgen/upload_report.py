@@ -34,6 +34,7 @@ def get_project_id(allure_name):
     return project_id
 
 def main():
-    zip_name = get_project_id(get_settings().ALLURE_RESULTS_DIR)
-    allure_results_dir = Path(get_settings().ALLURE_RESULTS_DIR)
-    upload_allure_report(zip_name, get_settings().SERVER_URL, allure_results_dir)
\ No newline at end of file
+    settings = get_settings()
+    zip_name = get_project_id(settings.ALLURE_RESULTS_DIR)
+    allure_results_dir = Path(settings.ALLURE_RESULTS_DIR)
+    upload_allure_report(zip_name, settings.SERVER_URL, allure_results_dir)
\ No newline at end of file
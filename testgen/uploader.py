@@ -0,0 +1,429 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+import uuid
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import requests
+from testgen.settings import get_settings
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+JOBS_DIR_NAME = "jobs"
+JOB_FILE_NAME = "job.json"
+RESULTS_DIR_NAME = "results"
+LOCK_FILE_NAME = "uploader.lock"
+PID_FILE_NAME = "uploader.pid"
+LOG_FILE_NAME = "uploader.log"
+HISTORY_FILE_NAME = "history.jsonl"
+HISTORY_SHOWN = 10
+
+# Seconds to wait before each retry within one uploader run. Jobs that still fail stay
+# in the spool and are retried by the next run.
+RETRY_DELAYS = (5, 30)
+
+_SIZE_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
+
+def parse_size(value) -> Optional[int]:
+    """Parse a size like ``512K`` or ``2G`` into bytes. Empty or 0 means no limit."""
+    if value is None:
+        return None
+    text = str(value).strip().lower()
+    if text.endswith("b"):
+        text = text[:-1]
+    unit = text[-1:] if text[-1:] in _SIZE_UNITS else ""
+    number = text[:len(text) - len(unit)].strip()
+    if not number:
+        if not text:
+            return None
+        raise ValueError(f"Invalid size '{value}'")
+    try:
+        size = int(float(number) * _SIZE_UNITS[unit])
+    except ValueError:
+        raise ValueError(f"Invalid size '{value}'")
+    return size if size > 0 else None
+
+
+def parse_rate(value) -> Optional[int]:
+    """Parse a bandwidth cap like ``512K`` or ``2M`` into bytes per second. Empty or 0 means no cap."""
+    if value is None:
+        return None
+    text = str(value).strip()
+    if text.lower().endswith("/s"):
+        text = text[:-2]
+    return parse_size(text)
+
+
+class _MultipartBody:
+    """
+    Multipart/form-data body for one file, sent as ``chunk_size`` pieces while iterating,
+    so the archive is never held in memory, and paced to ``rate`` bytes per second.
+
+    It has a length but no ``read``: the HTTP client would read file-like bodies in its own
+    block size, it iterates anything else.
+    """
+    def __init__(self, file_path: Path, field_name: str, rate: Optional[int] = None, chunk_size: int = 64 * 1024):
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        self._preamble = (
+            f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field_name}"; filename="{file_path.name}"\r\n'
+            f'Content-Type: application/zip\r\n\r\n'
+        ).encode('utf-8')
+        self._epilogue = f'\r\n--{boundary}--\r\n'.encode('utf-8')
+        self._length = len(self._preamble) + file_path.stat().st_size + len(self._epilogue)
+        self._file = open(file_path, 'rb')
+        self._parts = [self._preamble, self._file, self._epilogue]
+        self._rate = rate
+        self._chunk_size = chunk_size
+        self._sent = 0
+        self._started = None
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        while True:
+            chunk = self._read(self._chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def _read(self, size: int) -> bytes:
+        chunk = b''
+        while self._parts and not chunk:
+            part = self._parts[0]
+            if isinstance(part, bytes):
+                chunk, rest = part[:size], part[size:]
+                if rest:
+                    self._parts[0] = rest
+                else:
+                    self._parts.pop(0)
+            else:
+                chunk = part.read(size)
+                if not chunk:
+                    self._parts.pop(0)
+        self._throttle(len(chunk))
+        return chunk
+
+    def _throttle(self, size: int):
+        if not self._rate or not size:
+            return
+        if self._started is None:
+            self._started = time.monotonic()
+        self._sent += size
+        delay = self._sent / self._rate - (time.monotonic() - self._started)
+        if delay > 0:
+            time.sleep(delay)
+
+    def close(self):
+        self._file.close()
+
+
+def upload_file(zip_path: Path, server_url: str, rate: Optional[int] = None) -> Tuple[bool, Optional[str]]:
+    settings = get_settings()
+    body = _MultipartBody(zip_path, 'file', rate, settings.UPLOAD_CHUNK_SIZE)
+    try:
+        response = requests.post(server_url + "/upload", data=body, headers={'Content-Type': body.content_type},
+                                 timeout=settings.UPLOAD_TIMEOUT)
+    except requests.RequestException as e:
+        return False, str(e)
+    finally:
+        body.close()
+    if response.status_code == 200:
+        return True, None
+    return False, f"Server responded with status code: {response.status_code}"
+
+
+def _link_tree(source: Path, destination: Path):
+    """Snapshot a directory with hard links, falling back to a copy across file systems."""
+    try:
+        shutil.copytree(source, destination, copy_function=os.link)
+    except OSError:
+        shutil.rmtree(destination, ignore_errors=True)
+        shutil.copytree(source, destination)
+
+
+def _write_job(job_dir: Path, job: Dict):
+    tmp_path = job_dir / (JOB_FILE_NAME + ".tmp")
+    tmp_path.write_text(json.dumps(job), encoding='utf-8')
+    os.replace(tmp_path, job_dir / JOB_FILE_NAME)
+
+
+def _tree_size(path: Path) -> int:
+    # Hard linked results share their blocks with the originals, but count them in full:
+    # they are what is left once the originals are overwritten.
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def trim_spool(spool_dir: Path, max_size: int, keep: Path = None) -> List[str]:
+    """Drop the oldest pending jobs until the spool fits in ``max_size`` bytes. Returns the dropped job ids."""
+    jobs = [(job_dir, _tree_size(job_dir)) for job_dir in pending_jobs(spool_dir)]
+    total = sum(size for _, size in jobs)
+    dropped = []
+    for job_dir, size in jobs:
+        if total <= max_size:
+            break
+        if job_dir == keep:
+            continue
+        shutil.rmtree(job_dir, ignore_errors=True)
+        total -= size
+        dropped.append(job_dir.name)
+    return dropped
+
+
+def enqueue_upload(results_dir: Path, zip_name: str, server_url: str, spool_dir: Path,
+                   rate: Optional[int] = None, max_spool_size: Optional[int] = None) -> Path:
+    """
+    Put a snapshot of ``results_dir`` into the spool. The job only becomes visible to the
+    uploader once it is complete. With ``max_spool_size``, older jobs are dropped to make room.
+    """
+    jobs_dir = spool_dir / JOBS_DIR_NAME
+    jobs_dir.mkdir(parents=True, exist_ok=True)
+    job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    tmp_dir = jobs_dir / f".{job_id}"
+    tmp_dir.mkdir()
+    _link_tree(results_dir, tmp_dir / RESULTS_DIR_NAME)
+    _write_job(tmp_dir, {
+        "id": job_id,
+        "zip_name": zip_name,
+        "server_url": server_url,
+        "rate": rate,
+        "created": time.time(),
+        "attempts": 0,
+        "last_error": None,
+    })
+    job_dir = jobs_dir / job_id
+    os.replace(tmp_dir, job_dir)
+    if max_spool_size:
+        for dropped in trim_spool(spool_dir, max_spool_size, keep=job_dir):
+            print(f"Upload spool is over {max_spool_size} bytes, dropped pending upload {dropped}")
+    return job_dir
+
+
+def spawn_uploader(spool_dir: Path) -> subprocess.Popen:
+    """Start a detached uploader for the spool. It outlives the calling process."""
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    command = [sys.executable, "-c", "import sys; from testgen.uploader import main; sys.exit(main())",
+               "run", "--spool", str(spool_dir.resolve())]
+    kwargs = {}
+    if os.name == 'nt':
+        kwargs["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+    with open(spool_dir / LOG_FILE_NAME, 'a', encoding='utf-8') as log:
+        return subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+                                close_fds=True, **kwargs)
+
+
+def _process_alive(pid: int) -> bool:
+    if os.name == 'nt':
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        exit_code = ctypes.c_ulong()
+        try:
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))) and exit_code.value == 259
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class _SpoolLock:
+    """
+    Non-blocking lock, so only one uploader drains a spool. The OS drops it if the holder dies.
+    The holder's pid is kept next to it, so others can tell whether an uploader runs without
+    taking the lock themselves.
+    """
+    def __init__(self, spool_dir: Path):
+        self.path = spool_dir / LOCK_FILE_NAME
+        self.pid_path = spool_dir / PID_FILE_NAME
+        self._file = None
+
+    def acquire(self) -> bool:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.path, 'a+')
+        try:
+            if os.name == 'nt':
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._file = lock_file
+        self.pid_path.write_text(str(os.getpid()), encoding='utf-8')
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            self.pid_path.unlink()
+        except OSError:
+            pass
+        if os.name == 'nt':
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
+
+    @staticmethod
+    def held(spool_dir: Path) -> bool:
+        """Whether a live uploader holds the spool, read from its pid file. A dead holder leaves a stale one."""
+        try:
+            pid = int((spool_dir / PID_FILE_NAME).read_text(encoding='utf-8').strip())
+        except (OSError, ValueError):
+            return False
+        return _process_alive(pid)
+
+
+def pending_jobs(spool_dir: Path) -> List[Path]:
+    jobs_dir = spool_dir / JOBS_DIR_NAME
+    if not jobs_dir.exists():
+        return []
+    return sorted(path for path in jobs_dir.iterdir()
+                  if not path.name.startswith('.') and (path / JOB_FILE_NAME).exists())
+
+
+def _read_job(job_dir: Path) -> Dict:
+    with open(job_dir / JOB_FILE_NAME, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _compress(job_dir: Path, zip_path: Path):
+    results_dir = job_dir / RESULTS_DIR_NAME
+    tmp_path = zip_path.with_name(zip_path.name + ".tmp")
+    with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for root, _, files in os.walk(results_dir):
+            for file in files:
+                file_path = os.path.join(root, file)
+                zipf.write(file_path, os.path.relpath(file_path, results_dir))
+    os.replace(tmp_path, zip_path)
+    shutil.rmtree(results_dir, ignore_errors=True)
+
+
+def process_job(job_dir: Path, spool_dir: Path, retry_delays=RETRY_DELAYS) -> bool:
+    job = _read_job(job_dir)
+    zip_path = job_dir / job["zip_name"]
+    if not zip_path.exists():
+        _compress(job_dir, zip_path)
+
+    for delay in (0,) + tuple(retry_delays):
+        if delay:
+            time.sleep(delay)
+        job["attempts"] += 1
+        uploaded, error = upload_file(zip_path, job["server_url"], job.get("rate"))
+        if uploaded:
+            record = {key: job[key] for key in ("id", "zip_name", "server_url", "attempts")}
+            record["uploaded"] = time.time()
+            with open(spool_dir / HISTORY_FILE_NAME, 'a', encoding='utf-8') as history:
+                history.write(json.dumps(record) + "\n")
+            shutil.rmtree(job_dir, ignore_errors=True)
+            print(f"Uploaded {job['zip_name']} ({job['id']}) after {job['attempts']} attempt(s)")
+            return True
+        job["last_error"] = error
+        _write_job(job_dir, job)
+        print(f"Upload of {job['zip_name']} ({job['id']}) failed: {error}")
+    return False
+
+
+def run_uploader(spool_dir: Path, retry_delays=RETRY_DELAYS) -> int:
+    """
+    Drain the spool, trying every job once per run, and return the number of jobs left.
+    Returns right away if another uploader holds the spool, it picks up new jobs itself.
+    """
+    attempted = set()
+    failed = 0
+    lock = _SpoolLock(spool_dir)
+    while True:
+        if not lock.acquire():
+            return 0
+        try:
+            while True:
+                jobs = [job_dir for job_dir in pending_jobs(spool_dir) if job_dir.name not in attempted]
+                if not jobs:
+                    break
+                for job_dir in jobs:
+                    attempted.add(job_dir.name)
+                    try:
+                        if not process_job(job_dir, spool_dir, retry_delays):
+                            failed += 1
+                    except (OSError, ValueError, KeyError) as e:
+                        failed += 1
+                        print(f"Could not process job {job_dir.name}: {e}")
+        finally:
+            lock.release()
+        # A job enqueued while the lock was being released would otherwise wait for the next run.
+        if not any(job_dir.name not in attempted for job_dir in pending_jobs(spool_dir)):
+            return failed
+
+
+def uploader_status(spool_dir: Path) -> Dict:
+    # Taking the lock here would make an uploader starting at the same moment see the spool as taken and exit.
+    running = _SpoolLock.held(spool_dir)
+
+    pending = []
+    for job_dir in pending_jobs(spool_dir):
+        try:
+            job = _read_job(job_dir)
+        except (OSError, ValueError):
+            continue
+        pending.append({
+            "id": job["id"],
+            "zip_name": job["zip_name"],
+            "server_url": job["server_url"],
+            "created": job["created"],
+            "attempts": job["attempts"],
+            "last_error": job["last_error"],
+            "compressed": (job_dir / job["zip_name"]).exists(),
+        })
+
+    recent = []
+    history_path = spool_dir / HISTORY_FILE_NAME
+    if history_path.exists():
+        with open(history_path, 'r', encoding='utf-8') as history:
+            recent = [json.loads(line) for line in history.read().splitlines()[-HISTORY_SHOWN:] if line]
+
+    return {"spool": str(spool_dir), "running": running, "pending": pending, "recent": recent}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Background uploader for Allure results spooled by pytest")
+    parser.add_argument('command', choices=("status", "run"),
+                        help="Show the spool and the uploader state, or upload the pending reports now")
+    parser.add_argument('--spool', type=str, default=None,
+                        help="Spool directory (default: UPLOAD_SPOOL_DIR from the settings)")
+
+    args = parser.parse_args()
+
+    if args.spool:
+        spool_dir = Path(args.spool)
+    else:
+        spool_dir = Path(get_settings().UPLOAD_SPOOL_DIR)
+
+    if args.command == "status":
+        print(json.dumps(uploader_status(spool_dir), indent=2))
+        return 0
+
+    return 1 if run_uploader(spool_dir) else 0
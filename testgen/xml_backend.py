@@ -0,0 +1,325 @@
+import re
+from typing import Optional, Iterator, Tuple, List
+from xml.etree import ElementTree
+
+NAMESPACE = "namespace"
+HEADER = "header"
+SPEC_OBJECT = "spec-object"
+HIERARCHY = "hierarchy"
+HIERARCHY_OBJECT = "hierarchy-object"
+
+DEFAULT_BACKEND = "auto"
+
+
+def _get_namespace(tag: str) -> str:
+    match = re.match(r'\{(.*)}', tag)
+    return match.group(1) if match else ''
+
+
+class ReqifNames:
+    """Qualified ReqIF tag names and lookup paths for one namespace, built once per document."""
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        q = self.qualify
+        self.core_content = q("CORE-CONTENT")
+        self.req_if_content = q("REQ-IF-CONTENT")
+        self.req_if_header = q("REQ-IF-HEADER")
+        self.title = q("TITLE")
+        self.project_id = q("PROJECT-ID")
+        self.comment = q("COMMENT")
+        self.spec_objects = q("SPEC-OBJECTS")
+        self.spec_object = q("SPEC-OBJECT")
+        self.spec_object_type_ref = f"{q('TYPE')}/{q('SPEC-OBJECT-TYPE-REF')}"
+        self.values = q("VALUES")
+        self.attribute_value_string = q("ATTRIBUTE-VALUE-STRING")
+        self.string_definition_ref = f"{q('DEFINITION')}/{q('ATTRIBUTE-DEFINITION-STRING-REF')}"
+        self.specification = q("SPECIFICATION")
+        self.spec_hierarchy = q("SPEC-HIERARCHY")
+        self.spec_object_ref = f"{q('OBJECT')}/{q('SPEC-OBJECT-REF')}"
+        self.object_ref = q("SPEC-OBJECT-REF")
+
+    def qualify(self, tag: str) -> str:
+        return f"{{{self.namespace}}}{tag}" if self.namespace else tag
+
+
+class _DocumentState:
+    def __init__(self):
+        self.seen = set()
+        self.open_hierarchies: List[Tuple[int, int]] = []
+        self.next_hierarchy_index = 0
+        self.last_object_index = -1
+
+    def start_hierarchy(self):
+        parent_index = self.open_hierarchies[-1][0] if self.open_hierarchies else -1
+        self.open_hierarchies.append((self.next_hierarchy_index, parent_index))
+        self.next_hierarchy_index += 1
+
+    def object_read(self) -> Optional[Tuple[int, int]]:
+        """The innermost open hierarchy, the first time a SPEC-OBJECT-REF is read inside it."""
+        if not self.open_hierarchies or self.open_hierarchies[-1][0] == self.last_object_index:
+            return None
+        self.last_object_index = self.open_hierarchies[-1][0]
+        return self.open_hierarchies[-1]
+
+    def validate(self):
+        if "core-content" not in self.seen:
+            raise ValueError("CORE-CONTENT not found in the ReqIF file")
+        if "req-if-content" not in self.seen:
+            raise ValueError("REQ-IF-CONTENT not found")
+        if "spec-object" not in self.seen:
+            raise ValueError("No SPEC-OBJECTS found in this file.")
+        if "specification" not in self.seen:
+            raise ValueError("No SPECIFICATIONS found in this file.")
+
+
+class StdlibBackend:
+    """
+    Reads ReqIF documents with ``xml.etree.ElementTree.iterparse``.
+
+    ``iter_records`` yields, in document order:
+      (NAMESPACE, namespace)
+      (HEADER, {"title": ..., "project_id": ..., "comment": ...})
+      (SPEC_OBJECT, identifier, spec_type, [(definition_ref, the_value), ...])
+      (HIERARCHY, index, parent_index, object_ref)
+    Hierarchy indices are assigned in pre-order, but records are yielded when a
+    SPEC-HIERARCHY closes, so every child record precedes its parent's.
+
+    With ``object_refs=True`` it also yields (HIERARCHY_OBJECT, index, parent_index, object_ref)
+    as soon as the OBJECT of an open SPEC-HIERARCHY is read, which is before its children
+    when the document writes OBJECT ahead of CHILDREN.
+    """
+    name = "stdlib"
+
+    def iter_records(self, source, object_refs: bool = False) -> Iterator[tuple]:
+        names = None
+        state = _DocumentState()
+        for event, element in ElementTree.iterparse(source, events=("start", "end")):
+            if names is None:
+                names = ReqifNames(_get_namespace(element.tag))
+                yield NAMESPACE, names.namespace
+            tag = element.tag
+            if event == "start":
+                if tag == names.spec_hierarchy:
+                    state.start_hierarchy()
+                continue
+
+            if tag == names.spec_object:
+                state.seen.add("spec-object")
+                yield self._spec_object_record(element, names)
+                element.clear()
+            elif tag == names.spec_hierarchy:
+                index, parent_index = state.open_hierarchies.pop()
+                object_ref = element.find(names.spec_object_ref)
+                yield HIERARCHY, index, parent_index, object_ref.text if object_ref is not None else None
+                element.clear()
+            elif tag == names.object_ref:
+                if object_refs:
+                    hierarchy = state.object_read()
+                    if hierarchy is not None:
+                        yield (HIERARCHY_OBJECT, *hierarchy, element.text)
+            elif tag == names.req_if_header:
+                yield HEADER, self._header(element, names)
+            elif tag == names.specification:
+                state.seen.add("specification")
+                element.clear()
+            elif tag == names.spec_objects:
+                element.clear()
+            elif tag == names.core_content:
+                state.seen.add("core-content")
+            elif tag == names.req_if_content:
+                state.seen.add("req-if-content")
+        state.validate()
+
+    def read_header(self, source) -> Optional[dict]:
+        names = None
+        for event, element in ElementTree.iterparse(source, events=("start", "end")):
+            if names is None:
+                names = ReqifNames(_get_namespace(element.tag))
+            if event == "start":
+                continue
+            if element.tag == names.req_if_header:
+                return self._header(element, names)
+            if element.tag == names.spec_object:
+                element.clear()
+        return None
+
+    @staticmethod
+    def _spec_object_record(element, names: ReqifNames):
+        spec_type = element.find(names.spec_object_type_ref)
+        attributes = []
+        values = element.find(names.values)
+        if values is not None:
+            for attr_value in values.findall(names.attribute_value_string):
+                definition_ref = attr_value.find(names.string_definition_ref)
+                if definition_ref is not None:
+                    attributes.append((definition_ref.text, attr_value.get("THE-VALUE", "")))
+        return (
+            SPEC_OBJECT,
+            element.get("IDENTIFIER", ""),
+            spec_type.text if spec_type is not None else "",
+            attributes
+        )
+
+    @staticmethod
+    def _header(element, names: ReqifNames):
+        title = element.find(names.title)
+        project_id = element.find(names.project_id)
+        comment = element.find(names.comment)
+        return {
+            "title": title.text if title is not None else None,
+            "project_id": project_id.text if project_id is not None else None,
+            "comment": comment.text if comment is not None else None,
+        }
+
+
+class LxmlBackend:
+    """
+    Same records as StdlibBackend, read with ``lxml.etree.iterparse`` filtered to the
+    tags the parser needs and with the per-element lookups done by compiled XPath.
+    """
+    name = "lxml"
+
+    _TAGS = ("CORE-CONTENT", "REQ-IF-CONTENT", "REQ-IF-HEADER", "SPEC-OBJECT", "SPECIFICATION", "SPEC-HIERARCHY")
+
+    def __init__(self):
+        from lxml import etree
+        self.etree = etree
+        self._xpaths = {}
+
+    def iter_records(self, source, object_refs: bool = False) -> Iterator[tuple]:
+        yielded = 0
+        try:
+            for record in self._iter_lxml_records(source, object_refs):
+                yield record
+                yielded += 1
+        except self.etree.XMLSyntaxError as e:
+            # libxml2 stops at 2048 nested elements even with huge_tree, about 1,000 hierarchy
+            # levels. The standard library has no such limit, so the document is read again
+            # with it, skipping the records already yielded: both backends yield the same ones.
+            if "depth" not in str(e).lower():
+                raise
+            if hasattr(source, "seek"):
+                source.seek(0)
+            for index, record in enumerate(StdlibBackend().iter_records(source, object_refs)):
+                if index >= yielded:
+                    yield record
+
+    def _iter_lxml_records(self, source, object_refs: bool) -> Iterator[tuple]:
+        etree = self.etree
+        names = None
+        xpaths = None
+        state = _DocumentState()
+        tags = self._TAGS + ("SPEC-OBJECT-REF",) if object_refs else self._TAGS
+        context = etree.iterparse(
+            source, events=("start", "end"), tag=[f"{{*}}{tag}" for tag in tags], huge_tree=True
+        )
+        for event, element in context:
+            if names is None:
+                names = ReqifNames(etree.QName(element).namespace or "")
+                xpaths = self._compiled(names.namespace)
+                yield NAMESPACE, names.namespace
+            tag = element.tag
+            if event == "start":
+                if tag == names.spec_hierarchy:
+                    state.start_hierarchy()
+                continue
+
+            if tag == names.spec_object:
+                state.seen.add("spec-object")
+                spec_type = xpaths["spec_type"](element)
+                yield SPEC_OBJECT, element.get("IDENTIFIER", ""), spec_type[0] if spec_type else "", \
+                    self._attributes(element, xpaths)
+                self._release(element)
+            elif tag == names.spec_hierarchy:
+                index, parent_index = state.open_hierarchies.pop()
+                object_ref = xpaths["object_ref"](element)
+                yield HIERARCHY, index, parent_index, object_ref[0] if object_ref else None
+                self._release(element)
+            elif tag == names.object_ref:
+                hierarchy = state.object_read()
+                if hierarchy is not None:
+                    yield (HIERARCHY_OBJECT, *hierarchy, element.text)
+            elif tag == names.req_if_header:
+                yield HEADER, self._header(element, xpaths)
+            elif tag == names.specification:
+                state.seen.add("specification")
+                self._release(element)
+            elif tag == names.core_content:
+                state.seen.add("core-content")
+            elif tag == names.req_if_content:
+                state.seen.add("req-if-content")
+        state.validate()
+
+    def read_header(self, source) -> Optional[dict]:
+        for _, element in self.etree.iterparse(source, events=("end",), tag="{*}REQ-IF-HEADER"):
+            return self._header(element, self._compiled(self.etree.QName(element).namespace or ""))
+        return None
+
+    def _compiled(self, namespace: str):
+        if namespace not in self._xpaths:
+            prefix = "r:" if namespace else ""
+            namespaces = {"r": namespace} if namespace else None
+            compile_xpath = lambda path: self.etree.XPath(
+                path.format(r=prefix), namespaces=namespaces, smart_strings=False
+            )
+            self._xpaths[namespace] = {
+                "spec_type": compile_xpath("{r}TYPE/{r}SPEC-OBJECT-TYPE-REF/text()"),
+                "attribute_values": compile_xpath("{r}VALUES/{r}ATTRIBUTE-VALUE-STRING"),
+                "definition_ref": compile_xpath("{r}DEFINITION/{r}ATTRIBUTE-DEFINITION-STRING-REF/text()"),
+                "definition_refs": compile_xpath(
+                    "{r}VALUES/{r}ATTRIBUTE-VALUE-STRING/{r}DEFINITION/{r}ATTRIBUTE-DEFINITION-STRING-REF/text()"
+                ),
+                "the_values": compile_xpath("{r}VALUES/{r}ATTRIBUTE-VALUE-STRING/@THE-VALUE"),
+                "object_ref": compile_xpath("{r}OBJECT/{r}SPEC-OBJECT-REF/text()"),
+                "title": compile_xpath("{r}TITLE/text()"),
+                "project_id": compile_xpath("{r}PROJECT-ID/text()"),
+                "comment": compile_xpath("{r}COMMENT/text()"),
+            }
+        return self._xpaths[namespace]
+
+    @staticmethod
+    def _attributes(element, xpaths):
+        definition_refs = xpaths["definition_refs"](element)
+        the_values = xpaths["the_values"](element)
+        if len(definition_refs) == len(the_values):
+            return list(zip(definition_refs, the_values))
+        # An attribute without a definition or value, fall back to pairing them one by one.
+        attributes = []
+        for attr_value in xpaths["attribute_values"](element):
+            definition_ref = xpaths["definition_ref"](attr_value)
+            if definition_ref:
+                attributes.append((definition_ref[0], attr_value.get("THE-VALUE", "")))
+        return attributes
+
+    @staticmethod
+    def _release(element):
+        # Only the element's content is dropped; unlinking it from its parent as well
+        # costs more than the empty node it would free.
+        element.clear(keep_tail=True)
+
+    @staticmethod
+    def _header(element, xpaths):
+        values = {}
+        for key in ("title", "project_id", "comment"):
+            found = xpaths[key](element)
+            values[key] = found[0] if found else None
+        return values
+
+
+def get_backend(name: Optional[str] = None):
+    """
+    Return an XML backend by name. ``"auto"`` (the default) prefers lxml when it is
+    installed and falls back to the standard library.
+    """
+    name = name or DEFAULT_BACKEND
+    if name == "stdlib":
+        return StdlibBackend()
+    if name == "lxml":
+        return LxmlBackend()
+    if name == "auto":
+        try:
+            return LxmlBackend()
+        except ImportError:
+            return StdlibBackend()
+    raise ValueError(f"Unknown XML backend '{name}'. Expected one of: auto, stdlib, lxml.")
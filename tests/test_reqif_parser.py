@@ -0,0 +1,25 @@
+from testgen.reqif_parser import TreeNode, requirement_digests
+
+
+def make_test_case():
+    return TreeNode("C1", "case 1", "scenario", "_TestCaseType", raw_attributes={
+        "_Steps": "a,b",
+        "_Prerequisites": "p",
+        "_Parameters": '[{"name": "speed", "type": "int", "value": ["1", "2"]}]',
+    })
+
+
+def test_digest_does_not_depend_on_decoding():
+    node = make_test_case()
+    before = requirement_digests([node])
+    assert node.steps == ["a", "b"]
+    assert node.prerequisites == ["p"]
+    assert node.parameters[0].value == [1, 2]
+    assert requirement_digests([node]) == before == requirement_digests([make_test_case()])
+
+
+def test_digest_follows_assigned_values():
+    node = make_test_case()
+    before = requirement_digests([node])
+    node.steps = ["a", "c"]
+    assert requirement_digests([node]) != before
@@ -0,0 +1,55 @@
+import pytest
+
+from testgen.reqif_parser import ReqifParser
+
+REQIF_NAMESPACE = "http://www.omg.org/spec/ReqIF/20110401/reqif.xsd"
+# Deeper than the 2048 nested elements libxml2 accepts: every hierarchy level is two elements.
+DEPTH = 1100
+
+
+def write_deep_reqif(path, depth):
+    spec_objects = "".join(
+        f'<SPEC-OBJECT IDENTIFIER="R{i}"><TYPE><SPEC-OBJECT-TYPE-REF>_RequirementType</SPEC-OBJECT-TYPE-REF></TYPE>'
+        f'<VALUES><ATTRIBUTE-VALUE-STRING THE-VALUE="Requirement {i}"><DEFINITION>'
+        f'<ATTRIBUTE-DEFINITION-STRING-REF>_Requirement_Title</ATTRIBUTE-DEFINITION-STRING-REF>'
+        f'</DEFINITION></ATTRIBUTE-VALUE-STRING></VALUES></SPEC-OBJECT>'
+        for i in range(depth))
+    hierarchy = "".join(
+        f'<SPEC-HIERARCHY IDENTIFIER="H{i}"><OBJECT><SPEC-OBJECT-REF>R{i}</SPEC-OBJECT-REF></OBJECT><CHILDREN>'
+        for i in range(depth)) + "</CHILDREN></SPEC-HIERARCHY>" * depth
+    path.write_text(
+        f'<?xml version="1.0" encoding="UTF-8"?><REQ-IF xmlns="{REQIF_NAMESPACE}"><THE-HEADER>'
+        f'<REQ-IF-HEADER IDENTIFIER="header"><TITLE>Deep</TITLE></REQ-IF-HEADER></THE-HEADER>'
+        f'<CORE-CONTENT><REQ-IF-CONTENT><SPEC-OBJECTS>{spec_objects}</SPEC-OBJECTS><SPECIFICATIONS>'
+        f'<SPECIFICATION IDENTIFIER="specification"><CHILDREN>{hierarchy}</CHILDREN></SPECIFICATION>'
+        f'</SPECIFICATIONS></REQ-IF-CONTENT></CORE-CONTENT></REQ-IF>', encoding='utf-8')
+    return path
+
+
+@pytest.fixture
+def deep_reqif(tmp_path):
+    return write_deep_reqif(tmp_path / "deep.reqif", DEPTH)
+
+
+def count_nodes(node):
+    count, stack = 0, [node]
+    while stack:
+        current = stack.pop()
+        count += 1
+        stack.extend(current.children)
+    return count
+
+
+@pytest.mark.parametrize("backend", ["stdlib", "auto", "lxml"])
+def test_deep_hierarchy_is_parsed(deep_reqif, backend):
+    if backend == "lxml":
+        pytest.importorskip("lxml")
+    roots = ReqifParser(str(deep_reqif), backend=backend).parse_reqif()
+    assert len(roots) == 1
+    assert count_nodes(roots[0]) == DEPTH
+
+
+@pytest.mark.parametrize("backend", ["stdlib", "auto"])
+def test_deep_hierarchy_is_streamed(deep_reqif, backend):
+    nodes = list(ReqifParser(str(deep_reqif), backend=backend).iter_hierarchy())
+    assert len(nodes) == DEPTH